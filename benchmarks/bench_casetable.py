@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark: a large suite held as dicts + namedtuples (what getTestCases keeps)
+versus a CaseTable.
+
+    python benchmarks/bench_casetable.py [number of cases]
+"""
+from __future__ import print_function
+from collections import namedtuple
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from TestRail.casetable import CaseTable  # noqa: E402
+
+
+def makeCases(count, seed=1):
+    """
+    Synthetic cases shaped like a get_cases response
+    """
+    rnd = random.Random(seed)
+    for n in range(1, count + 1):
+        yield {
+            "id": n,
+            "title": "Verify behaviour %d of component %d" % (n, n % 97),
+            "section_id": rnd.randint(1, 400),
+            "template_id": 2,
+            "type_id": rnd.choice([1, 3, 6, 7]),
+            "priority_id": rnd.randint(1, 4),
+            "milestone_id": None,
+            "refs": "RF-%d, RF-%d" % (rnd.randint(1, 300), rnd.randint(1, 300)),
+            "created_by": rnd.randint(1, 40),
+            "created_on": 1392300984 + n,
+            "updated_by": rnd.randint(1, 40),
+            "updated_on": 1393586511 + n,
+            "estimate": rnd.choice([None, "30s", "1m", "1m 5s", "5m"]),
+            "estimate_forecast": None,
+            "suite_id": 1,
+            "custom_automation_type": rnd.choice([0, 1, 2]),
+            "custom_component": rnd.choice(["Core", "UI", "API", "Storage", "Network"]),
+            "custom_preconds": "The system is installed and user %d is logged in." % (n % 50),
+            "custom_steps_separated": [
+                {"content": "Step %d of case %d" % (s, n), "expected": "Expected result %d" % s}
+                for s in range(1, rnd.randint(2, 8))
+            ],
+        }
+
+
+def measure(build):
+    tracemalloc.start()
+    held = build()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return current
+
+
+def asDicts():
+    return list(makeCases(COUNT))
+
+
+def asNamedtuples():
+    dicts = list(makeCases(COUNT))
+    tuples = [namedtuple("WSData", d.keys())(**d) for d in dicts]
+    return dicts, tuples
+
+
+def asCaseTable():
+    return CaseTable(makeCases(COUNT))
+
+
+if __name__ == "__main__":
+    COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 150000
+    dicts = measure(asDicts)
+    baseline = measure(asNamedtuples)
+    table = measure(asCaseTable)
+    print("cases:                 %d" % COUNT)
+    print("dicts only:            %8.1f MB" % (dicts / 1e6))
+    print("dicts + namedtuples:   %8.1f MB" % (baseline / 1e6))
+    print("CaseTable:             %8.1f MB" % (table / 1e6))
+    print("reduction:             %8.1fx vs dicts + namedtuples, %.1fx vs dicts only" % (
+        float(baseline) / table, float(dicts) / table))
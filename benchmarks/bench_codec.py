@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+JSON codec benchmark on get_cases and add_results_for_cases sized payloads, for every
+codec backend that is installed, plus the cost of turning decoded cases into records.
+
+    python benchmarks/bench_codec.py [number of cases]
+"""
+from __future__ import print_function
+from collections import namedtuple
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from TestRail import asRecord  # noqa: E402
+from TestRail.codec import CODECS  # noqa: E402
+from bench_casetable import makeCases  # noqa: E402
+
+
+def makeResults(count, seed=2):
+    """
+    Synthetic add_results_for_cases body
+    """
+    rnd = random.Random(seed)
+    return {"results": [{
+        "case_id": n,
+        "status_id": rnd.choice([1, 1, 1, 1, 5]),
+        "elapsed": "%ds" % rnd.randint(1, 600),
+        "version": "2.14.0-rc3+build.%d" % rnd.randint(1000, 1100),
+        "comment": rnd.choice(["", "AssertionError: expected 200, got 503\n  at test_api.py:%d" % n]),
+        "custom_environment": rnd.randint(1, 6),
+    } for n in range(1, count + 1)]}
+
+
+def best(stmt, number=5):
+    return min(timeit.repeat(stmt, number=1, repeat=number)) * 1000
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cases = list(makeCases(count))
+    results = makeResults(count)
+    reference = CODECS[-1]()
+    casesBody = reference.encode({"cases": cases})
+    pageBody = reference.encode({"cases": cases[:250]})
+
+    print("%d cases (%.1f MB), %d results (%.1f MB), best of 5, ms" % (
+        count, len(casesBody) / 1e6, count, len(reference.encode(results)) / 1e6))
+    print("%-10s %14s %14s %14s" % ("codec", "decode cases", "decode page", "encode results"))
+    for codecType in CODECS:
+        try:
+            codec = codecType()
+        except ImportError:
+            print("%-10s %14s" % (codecType.name, "not installed"))
+            continue
+        print("%-10s %14.1f %14.2f %14.1f" % (
+            codec.name,
+            best(lambda: codec.decode(casesBody)),
+            best(lambda: codec.decode(pageBody)),
+            best(lambda: codec.encode(results))))
+
+    decoded = reference.decode(casesBody)["cases"]
+    print()
+    print("records from %d decoded cases, ms" % count)
+    print("%-34s %8.1f" % ("namedtuple type per case (before)",
+                           best(lambda: [namedtuple("WSData", x.keys())(**x) for x in decoded], 1)))
+    print("%-34s %8.1f" % ("asRecord", best(lambda: [asRecord(x) for x in decoded])))
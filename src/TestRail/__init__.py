@@ -1,19 +1,46 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals, print_function
 from TRLogging import log
-from typing import List
+from typing import List, Dict
 from collections import namedtuple
+from functools import lru_cache
 import logging
 import sys
 import os
 from .api import *
+from .sync import *
+from .fields import *
+from .casetable import *
+from .attachments import *
+from .concurrency import *
+from .snapshot import *
+from .watcher import *
+from .deadline import *
+from .hedge import *
 
 
 Vector = List[str]
 
+@lru_cache(maxsize=None)
+def recordType(fields: tuple) -> type:
+    """
+    The namedtuple type for a set of fields, created once and reused for every record
+    with the same fields
+    """
+    return namedtuple("WSData", fields, rename=True)
+
+
+def asRecord(obj: Dict) -> namedtuple:
+    """
+    Turn a decoded JSON object into a namedtuple without copying it into keyword arguments
+    """
+    return recordType(tuple(obj))(*obj.values())
+
+
 def objectBuilder(*args: Vector, **kwargs) -> namedtuple:
-    wsdata = namedtuple("WSData", args)
-    return wsdata(**kwargs)
+    if len(args) == 1 and not isinstance(args[0], str):
+        args = args[0]
+    return recordType(tuple(args))(**kwargs)
 
 TRACE = 5
 
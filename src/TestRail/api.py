@@ -2,11 +2,113 @@
 from __future__ import unicode_literals
 from .base import APIBase
 from . import log
-from . import objectBuilder
-from typing import Sequence, NamedTuple, Dict
+from . import objectBuilder, asRecord
+from .codec import JSONCodec, getCodec
+from .fields import FieldSchema
+from .casetable import CaseTable
+from .deadline import DeadlineExceeded, current, timeoutFor
+from .hedge import HedgePolicy
+from typing import Sequence, NamedTuple, Dict, Iterable, List
+from collections import OrderedDict, defaultdict
+import socket
+import threading
+import time
 import urllib2
-import json
 import base64
+import mimetypes
+import os
+import uuid
+
+__all__ = ["DEFAULT_TIMEOUT", "MultipartFile", "APIClient", "APIError", "BatchError",
+           "APIBase", "TestSuites", "RunTestIndex", "TestRun", "ResultList", "TestCases",
+           "TestProjects", "TestResults"]
+
+
+DEFAULT_TIMEOUT = 60.0
+
+
+class MultipartFile:
+    """
+    A multipart/form-data request body streamed from a file. The file is read in CHUNK
+    sized pieces while the request is sent, so it is never loaded into memory as a whole.
+
+    Variables:
+        contentType {str} -- The Content-Type header value, including the boundary
+        length {int} -- The total body size in bytes, for the Content-Length header
+        size {int} -- The file size when the body was created. A file that is still being
+                      written is sent up to that size.
+    """
+    CHUNK = 1 << 20
+
+    def __init__(self, path, field="attachment", progress=None):
+        """
+        Arguments:
+            path {str} -- The file to send
+
+        Keyword Arguments:
+            field {str} -- The form field name (default: {"attachment"})
+            progress {callable} -- Called as progress(path, sent, total) after every read
+                                   (default: {None})
+        """
+        boundary = uuid.uuid4().hex
+        filename = os.path.basename(path).replace('"', '%22')
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        self.contentType = 'multipart/form-data; boundary=%s' % boundary
+        self.__head = ('--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                       'Content-Type: %s\r\n\r\n' % (boundary, field, filename, mimetype)).encode('utf-8')
+        self.__tail = ('\r\n--%s--\r\n' % boundary).encode('utf-8')
+        self.size = os.path.getsize(path)
+        self.length = len(self.__head) + self.size + len(self.__tail)
+        self.path = path
+        self.progress = progress
+        self.sent = 0
+        self.__parts = None
+        self.__pending = b''
+        self.__offset = 0
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+    def __nextPart(self):
+        yield self.__head
+        left = self.size
+        with open(self.path, 'rb') as f:
+            while left > 0:
+                chunk = f.read(min(self.CHUNK, left))
+                if not chunk:
+                    raise IOError("%s shrank by %d bytes while being sent" % (self.path, left))
+                left -= len(chunk)
+                yield chunk
+        yield self.__tail
+
+    def read(self, size=-1):
+        """
+        Read the next piece of the body, never more than what is left of the current part
+        """
+        if self.__parts is None:
+            self.__parts = self.__nextPart()
+        if size is None or size < 0:
+            size = self.CHUNK
+        while self.__offset >= len(self.__pending):
+            self.__pending, self.__offset = next(self.__parts, b''), 0
+            if not self.__pending:
+                break
+        chunk = self.__pending[self.__offset:self.__offset + size]
+        self.__offset += len(chunk)
+        self.sent += len(chunk)
+        if chunk and self.progress:
+            self.progress(self.path, self.sent, self.length)
+        return chunk
+
+    def __repr__(self):
+        return "MultipartFile(%r, %d bytes)" % (self.path, self.length)
 
 
 class APIClient:
@@ -17,18 +119,31 @@ class APIClient:
     Variables:
 
     """
-    def __init__(self, base_url):
+    def __init__(self, base_url, codec: JSONCodec = None, timeout: float = DEFAULT_TIMEOUT,
+                 hedge: HedgePolicy = None):
         """
         Initialize the APUClient Instance
 
         Arguments:
             base_url {string} -- protocal plus hostname or address ie. http://hostnet.net
+
+        Keyword Arguments:
+            codec {JSONCodec} -- JSON encoder/decoder, by default the fastest installed
+                                 one (orjson, msgspec, ujson, json) (default: {None})
+            timeout {float} -- Socket timeout of each request in seconds, shortened to
+                               what is left of the current deadline, None to wait
+                               forever (default: {DEFAULT_TIMEOUT})
+            hedge {HedgePolicy} -- Hedge slow get_* requests (default: {None})
         """
         log.trace("APIClient.__init__   '%s'" % (base_url))
         self.user = ''
         self.password = ''
+        self.codec = codec or getCodec()
+        self.timeout = timeout
+        self.hedge = hedge
         if not base_url.endswith('/'):
             base_url += '/'
+        self.base_url = base_url
         self.__url = base_url + 'index.php?/api/v2/'
 
     def send_get(self, uri):
@@ -44,7 +159,7 @@ class APIClient:
             dict -- Server response data
         """
         log.trace("send_get  '%s'" % uri)
-        return self.__send_request('GET', uri, None)
+        return self.__get(uri)
 
     def send_post(self, uri, data):
         """
@@ -65,6 +180,66 @@ class APIClient:
         log.trace("send_post '%s', '%s'" % (uri, data))
         return self.__send_request('POST', uri, data)
 
+    def send_attachment(self, uri, path, progress=None):
+        """
+        Upload a file to an add_attachment_to_* endpoint. The multipart body is streamed
+        from disk so files of any size can be sent.
+
+        Arguments:
+            uri {string} -- The API method to call including parameters
+                            (e.g. add_attachment_to_result/1)
+            path {string} -- The file to upload
+
+        Keyword Arguments:
+            progress {callable} -- Called as progress(path, sent, total) while uploading
+                                   (default: {None})
+
+        Returns:
+            dict -- response data, {"attachment_id": ..}
+        """
+        log.trace("send_attachment '%s', '%s'" % (uri, path))
+        return self.__send_request('POST', uri, MultipartFile(path, progress=progress))
+
+    def send_get_paged(self, uri, key):
+        """
+        Issues GET requests against a paginated bulk endpoint and yields the
+        entities one at a time, following the '_links.next' reference until
+        the server reports no further pages. Only one page is held in memory
+        at a time. Servers that predate pagination return a plain list,
+        which is yielded as is.
+
+        Arguments:
+            uri {string} -- The API method to call including parameters
+                            (e.g. get_cases/1&suite_id=2)
+            key {string} -- The name of the entity list in a paged response
+                            (e.g. cases)
+
+        Yields:
+            dict -- One entity from the server response
+        """
+        log.trace("send_get_paged '%s', '%s'" % (uri, key))
+        while uri:
+            page = self.__get(uri)
+            if isinstance(page, list):
+                for item in page:
+                    yield item
+                return
+            for item in page.get(key, []):
+                yield item
+            uri = (page.get('_links') or {}).get('next')
+            if uri:
+                uri = uri.split('/api/v2/', 1)[-1]
+                log.debug("Next page: '%s'" % uri)
+
+    def __get(self, uri):
+        """
+        GET through the hedge policy when there is one. Only get_* endpoints are hedged,
+        the API also uses GET for close_run and the delete_* calls.
+        """
+        if self.hedge is not None and uri.lstrip('/').startswith('get_'):
+            return self.hedge.run(self.__send_request, 'GET', uri, None)
+        return self.__send_request('GET', uri, None)
+
     def __send_request(self, method, uri, data):
         """
         Do the heavy lifting for requests
@@ -72,58 +247,127 @@ class APIClient:
         Arguments:
             method {String} -- HTTP method name
             uri {string} -- full URL
-            data {dict} -- Any request data
+            data {dict} -- Any request data, or a MultipartFile to stream
 
         Returns:
             dict -- The response data
 
         Raises:
             APIError -- Any error responses get raised as exceptions
+            DeadlineExceeded -- The current deadline passed before or during the request
         """
         log.trace("__send_request  '%s', '%s', '%s'" % (method, uri, data))
         url = self.__url + uri
         request = urllib2.Request(url)
-        if (method == 'POST'):
-            request.add_data(json.dumps(data))
         log.debug("username = '%s', apikey = '%s'" % (self.user, self.password))
         auth = base64.b64encode('%s:%s' % (self.user, self.password))
         log.debug("auth = '%s'" % auth)
         request.add_header('Authorization', 'Basic %s' % auth)
-        request.add_header('Content-Type', 'application/json')
+        if isinstance(data, MultipartFile):
+            request.add_data(data)
+            request.add_header('Content-Type', data.contentType)
+            request.add_header('Content-Length', str(data.length))
+        else:
+            if (method == 'POST'):
+                request.add_data(self.codec.encode(data))
+            request.add_header('Content-Type', 'application/json')
 
-        e = None
+        timeout = timeoutFor(self.timeout)
+        # the name bound by "except .. as" is deleted when the block ends
+        httpError = None
         try:
-            response = urllib2.urlopen(request).read()
-        except urllib2.HTTPError as e:
-            response = e.read()
+            if timeout is None:
+                response = urllib2.urlopen(request).read()
+            else:
+                response = urllib2.urlopen(request, timeout=timeout).read()
+        except urllib2.HTTPError as err:
+            httpError = err
+            response = err.read()
+        except (socket.timeout, urllib2.URLError) as err:
+            d = current()
+            if d is not None and d.expired():
+                raise DeadlineExceeded("Deadline exceeded during %s %s: %s" % (method, uri, err))
+            raise
 
         if response:
-            result = json.loads(response)
+            result = self.codec.decode(response)
         else:
             result = {}
 
-        if e != None:
+        if httpError is not None:
             if result and 'error' in result:
                 error = '"' + result['error'] + '"'
             else:
                 error = 'No additional error message received'
-            raise APIError('TestRail API returned HTTP %s (%s)' % (e.code, error))
+            raise APIError('TestRail API returned HTTP %s (%s)' % (httpError.code, error),
+                           httpError.code)
         return result
 
 
 class APIError(Exception):
-    pass
+    """
+    An error response from the server
+
+    Variables:
+        code {int} -- The HTTP status code, if any
+    """
+
+    def __init__(self, message, code=None):
+        Exception.__init__(self, message)
+        self.code = code
+
+
+class BatchError(APIError):
+    """
+    Some batches of a bulk request failed. The others went through and are not undone.
+
+    Variables:
+        code {int} -- The HTTP status code of the first failed batch, if any
+        outcomes {list of tuple} -- (body, response, error) of every batch in the order
+                                    sent, response is None for the failed batches and
+                                    error is None for the others
+    """
+
+    def __init__(self, message, outcomes, code=None):
+        APIError.__init__(self, message, code)
+        self.outcomes = outcomes
+
+    @property
+    def failed(self) -> List[tuple]:
+        """
+        Returns:
+            list of tuple -- (body, error) of the failed batches
+        """
+        return [(body, error) for body, _, error in self.outcomes if error is not None]
 
 
 
 class APIBase:
     """
     Base class for classes accessing the Test Rail API
+
+    Variables:
+        options {dict} -- The codec, timeout and hedge of the client, passed on to the
+                          API objects a class builds for itself
     """
 
-    def __init__(self, baseurl, uname, apikey):
+    def __init__(self, baseurl, uname, apikey, codec: JSONCodec = None,
+                 timeout: float = DEFAULT_TIMEOUT, hedge: HedgePolicy = None):
+        """
+        Arguments:
+            baseurl {str} -- Base url for the server. https://hostname:port/
+            uname {str} -- The Test Rail username to use
+            apikey {str} -- The Test Rail API key for the user
+
+        Keyword Arguments:
+            codec {JSONCodec} -- JSON encoder/decoder (default: {None})
+            timeout {float} -- Socket timeout of each request in seconds, None to wait
+                               forever (default: {DEFAULT_TIMEOUT})
+            hedge {HedgePolicy} -- Hedge slow get_* requests (default: {None})
+        """
         self.__baseurl = baseurl
-        self.client = APIClient(self.__baseurl)
+        self.options = dict(codec=codec, timeout=timeout, hedge=hedge)
+        self.client = APIClient(self.__baseurl, **self.options)
         self.client.user = uname
         self.client.password = apikey
         return
@@ -140,16 +384,21 @@ class TestSuites(APIBase):
         __projects {TestProjects} -- Used to get project information
     """
 
-    def __init__(self, baseURI: str, uname: str, apiKey: str):
+    def __init__(self, baseURI: str, uname: str, apiKey: str, projects=None, **options):
         """
 
         Arguments:
             baseURI {str} -- Base url for the server. https://hostname:port/
             uname {str} -- The Test Rail username to use
             apiKey {str} -- The Test Rail API key for the user
+
+        Keyword Arguments:
+            projects {list of dict} -- Already known projects, passed on to TestProjects
+                                       (default: {None})
+            options -- codec, timeout and hedge, see APIBase
         """
-        APIBase.__init__(self, baseURI, uname, apiKey)
-        self.__projects = TestProjects(baseURI, uname, apiKey)
+        APIBase.__init__(self, baseURI, uname, apiKey, **options)
+        self.__projects = TestProjects(baseURI, uname, apiKey, projects=projects, **self.options)
 
     def getTestSuites(self, projectName: str) -> dict:
         """
@@ -342,10 +591,159 @@ class TestSuites(APIBase):
         log.trace("getSections '%s', '%s'" % (projID, suiteID))
         path = "get_sections/%s&suite_id=%s" % (projID, suiteID)
         log.debug("Path = %s" % path)
-        rslt = self.client.send_get(path)
+        rslt = list(self.client.send_get_paged(path, "sections"))
         log.debug(rslt)
         return rslt
 
+    def addSection(self, projID, suiteID, name, parentID=None, description=None):
+        """
+        Create a new section
+
+        Arguments:
+            projID {string} -- The project ID for the suite
+            suiteID {string} -- The suite the section belongs to
+            name {string} -- The name of the section
+            parentID {string} -- The parent section for a child section (default: {None})
+            description {string} -- The section description (default: {None})
+
+        Returns:
+            dict -- The new section as returned by the server
+        """
+        log.trace("addSection '%s', '%s', '%s', '%s'" % (projID, suiteID, name, parentID))
+        path = "add_section/%s" % projID
+        log.debug("Path = %s" % path)
+        data = {"suite_id": suiteID, "name": name}
+        if parentID:
+            data["parent_id"] = parentID
+        if description:
+            data["description"] = description
+        rslt = self.client.send_post(path, data)
+        log.debug(rslt)
+        return rslt
+
+class RunTestIndex:
+    """
+    Maps the case IDs of a test run to its test IDs and statuses, built from one
+    paginated get_tests fetch. Results posted through TestResults update the statuses.
+
+    Case IDs still not in the run after a refresh are remembered for MISS_TTL seconds, so
+    a caller that keeps reporting a case outside the run doesn't fetch the run again every
+    time.
+
+    Variables:
+        runID {int} -- The test run
+        missing {dict} -- case ID -> time it was last found missing after a refresh
+    """
+    MISS_TTL = 300
+
+    def __init__(self, runID, tests, missing=None):
+        """
+        Arguments:
+            runID {int} -- The test run
+            tests {iterable of dict} -- The get_tests response
+
+        Keyword Arguments:
+            missing {dict} -- missing of the index this one replaces (default: {None})
+        """
+        self.runID = runID
+        self.__byCase = {t["case_id"]: (t["id"], t["status_id"]) for t in tests}
+        self.__byTest = {testID: caseID for caseID, (testID, _) in self.__byCase.items()}
+        self.missing = {c: t for c, t in (missing or {}).items() if c not in self.__byCase}
+
+    def unknown(self, caseIDs) -> List:
+        """
+        The case IDs that are neither in the index nor recently found missing, i.e. those
+        worth a refresh
+        """
+        now = time.time()
+        return [c for c in caseIDs if c not in self.__byCase
+                and now - self.missing.get(c, 0) > self.MISS_TTL]
+
+    def markMissing(self, caseIDs):
+        """
+        Remember the case IDs that are not in the run, after a refresh
+        """
+        now = time.time()
+        for c in caseIDs:
+            if c not in self.__byCase:
+                self.missing[c] = now
+
+    def testID(self, caseID) -> int:
+        """
+        Raises:
+            KeyError -- The case is not part of the run
+        """
+        return self.__byCase[caseID][0]
+
+    def status(self, caseID) -> int:
+        """
+        Raises:
+            KeyError -- The case is not part of the run
+        """
+        return self.__byCase[caseID][1]
+
+    def update(self, results):
+        """
+        Take the statuses of newly added results into the index. Results without a status,
+        such as plain comments, leave the status of their test as it is.
+
+        Arguments:
+            results {iterable of dict} -- add_result(s) responses, with test_id and status_id
+        """
+        for r in results:
+            caseID = self.__byTest.get(r.get("test_id"))
+            if caseID is not None and r.get("status_id"):
+                self.__byCase[caseID] = (r["test_id"], r["status_id"])
+
+    def __contains__(self, caseID):
+        return caseID in self.__byCase
+
+    def __len__(self):
+        return len(self.__byCase)
+
+
+class _RunTestIndexes:
+    """
+    Process wide cache of RunTestIndex per server and run, dropped when the run is
+    updated or deleted through TestRun. Only the maxRuns most recently used runs are kept.
+    """
+
+    def __init__(self, maxRuns=64):
+        self.maxRuns = maxRuns
+        self.__lock = threading.Lock()
+        self.__indexes = OrderedDict()
+
+    def get(self, client, runID, refresh=False) -> RunTestIndex:
+        key = (client.base_url, runID)
+        with self.__lock:
+            index = self.__indexes.get(key)
+            if index is not None:
+                self.__indexes.move_to_end(key)
+        if index is None or refresh:
+            log.debug("Building test index for run %s" % runID)
+            index = RunTestIndex(runID, client.send_get_paged("get_tests/%s" % runID, "tests"),
+                                 index.missing if index is not None else None)
+            with self.__lock:
+                self.__indexes[key] = index
+                self.__indexes.move_to_end(key)
+                while len(self.__indexes) > self.maxRuns:
+                    self.__indexes.popitem(last=False)
+        return index
+
+    def update(self, client, runID, results):
+        with self.__lock:
+            index = self.__indexes.get((client.base_url, runID))
+        if index is not None:
+            index.update(results)
+
+    def invalidate(self, client, runID):
+        with self.__lock:
+            self.__indexes.pop((client.base_url, runID), None)
+
+
+runTestIndexes = _RunTestIndexes()
+
+
 class TestRun(APIBase):
     """
     Work with testruns
@@ -408,6 +806,46 @@ class TestRun(APIBase):
         path = "update_run/%s" % runID
         log.debug("path='%s'" % path)
         rslt = self.client.send_post(path, details)
+        runTestIndexes.invalidate(self.client, runID)
+        log.debug(rslt)
+        return rslt
+
+    def getTests(self, runID):
+        """
+        Get the tests of a test run
+
+        Arguments:
+            runID {int} -- The test run
+
+        Returns:
+            list of dict -- One test per case of the run, with its id, case_id and status_id
+        """
+        log.trace("getTests '%s'" % runID)
+        path = "get_tests/%s" % runID
+        log.debug("path='%s'" % path)
+        rslt = list(self.client.send_get_paged(path, "tests"))
+        log.debug(rslt)
+        return rslt
+
+    def addAttachmentToRun(self, runID, path, progress=None):
+        """
+        Attach a file to a test run. The file is streamed, not read into memory.
+
+        Arguments:
+            runID {int} -- The test run
+            path {str} -- The file to attach
+
+        Keyword Arguments:
+            progress {callable} -- Called as progress(path, sent, total) while uploading
+                                   (default: {None})
+
+        Returns:
+            dict -- Server response {"attachment_id": ..}
+        """
+        log.trace("addAttachmentToRun '%s', '%s'" % (runID, path))
+        uri = "add_attachment_to_run/%s" % runID
+        log.debug("path='%s'" % uri)
+        rslt = self.client.send_attachment(uri, path, progress)
         log.debug(rslt)
         return rslt
 
@@ -432,6 +870,7 @@ class TestRun(APIBase):
         path = "/delete_run/%s" % runID
         log.debug(path)
         rslt = self.client.send_get(path)
+        runTestIndexes.invalidate(self.client, runID)
         log.debug(rslt)
         return rslt
 
@@ -439,6 +878,18 @@ class TestRun(APIBase):
 ResultList = Sequence[NamedTuple]
 
 
+def _frozen(value):
+    """
+    A hashable stand-in for a JSON value, used to group equal field changes. Scalars are
+    paired with their type so that 1, 1.0 and True, which compare equal, stay apart.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _frozen(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return ("[",) + tuple(_frozen(v) for v in value)
+    return (type(value), value)
+
+
 class TestCases(APIBase):
     """
     An interface to test rail for working with test cases
@@ -448,8 +899,8 @@ class TestCases(APIBase):
 
     """
 
-    def __init__(self, baseURI, uname, apiKey):
-        APIBase.__init__(self, baseURI, uname, apiKey)
+    def __init__(self, baseURI, uname, apiKey, **options):
+        APIBase.__init__(self, baseURI, uname, apiKey, **options)
 
     def getTestCases(self, projectID: int, testSuiteID: int, sectionID: int = 0) -> ResultList:
         """
@@ -493,10 +944,31 @@ class TestCases(APIBase):
         if sectionID:
             path += "&section_id=%d" % sectionID
         log.debug("Path = '%s'" % path)
-        TCs = [objectBuilder(x.keys(), **x) for x in self.client.send_get(path) if x]
+        TCs = [asRecord(x) for x in self.client.send_get_paged(path, "cases") if x]
         log.debug(TCs)
         return TCs
 
+    def getCaseTable(self, projectID: int, testSuiteID: int, sectionID: int = 0) -> CaseTable:
+        """
+        Get the test cases for the project and suite in compact column storage. Use this
+        instead of getTestCases for very large suites, the cases are streamed page by page
+        into the table so the full response is never held as dicts.
+
+        Arguments:
+            projectID {int} -- The project the suite belongs to
+            testSuiteID {int} -- The suite to load
+            sectionID {int} -- Only load the cases of this section (default: {0})
+
+        Returns:
+            CaseTable -- The cases, rows have the same fields as getTestCases
+        """
+        log.trace("getCaseTable  '%d', '%d', '%d'" % (projectID, testSuiteID, sectionID))
+        path = "get_cases/%s&suite_id=%s" % (projectID, testSuiteID)
+        if sectionID:
+            path += "&section_id=%d" % sectionID
+        log.debug("Path = '%s'" % path)
+        return CaseTable(self.client.send_get_paged(path, "cases"))
+
     def getTestCaseTypes(self) -> ResultList:
         """
         The available test case types for the system
@@ -524,7 +996,7 @@ class TestCases(APIBase):
         """
         log.trace("getTestCaseTypes")
         path = "get_case_types"
-        rslt = [objectBuilder(x.keys(), **x) for x in self.client.send_get(path) if x]
+        rslt = [asRecord(x) for x in self.client.send_get(path) if x]
         log.debug(rslt)
         return rslt
 
@@ -556,7 +1028,7 @@ class TestCases(APIBase):
         """
         log.trace("getTestCasePriorities")
         path = "get_priorities"
-        rslt = [objectBuilder(x.keys(), **x) for x in self.client.send_get(path) if x]
+        rslt = [asRecord(x) for x in self.client.send_get(path) if x]
         log.debug(rslt)
         return rslt
 
@@ -615,7 +1087,7 @@ class TestCases(APIBase):
             def ooffyy(y: Dict) -> NamedTuple:
                 y["context"] = objectBuilder(y["context"].keys(), **y["context"])
                 y["options"] = objectBuilder(y["options"].keys(), **y["options"])
-                return objectBuilder(y.keys(), y)
+                return objectBuilder(y.keys(), **y)
             obj["configs"] = [ooffyy(b) for b in obj["configs"] if b]
             return objectBuilder(obj.keys(), **obj)
 
@@ -623,6 +1095,214 @@ class TestCases(APIBase):
         log.debug(rslt)
         return rslt
 
+    def getCaseFieldSchema(self, projectID) -> FieldSchema:
+        """
+        Get the case custom fields of a project compiled into a validator
+
+        Arguments:
+            projectID {int} -- The project the cases belong to
+
+        Returns:
+            FieldSchema -- Validator for the custom_* values of case payloads
+        """
+        log.trace("getCaseFieldSchema '%s'" % projectID)
+        return FieldSchema(self.client.send_get("get_case_fields"), projectID)
+
+    def addTestCase(self, sectionID, **details):
+        """
+        Create a new test case in the given section
+
+        Arguments:
+            sectionID {int} -- The section the case is added to
+            **details {dict} -- title (required), type_id, priority_id, estimate,
+                                milestone_id, refs and any custom fields
+
+        Returns:
+            dict -- The new case as returned by the server
+        """
+        log.trace("addTestCase '%s', '%s'" % (sectionID, details))
+        path = "add_case/%s" % sectionID
+        log.debug("Path = '%s'" % path)
+        rslt = self.client.send_post(path, details)
+        log.debug(rslt)
+        return rslt
+
+    def updateTestCase(self, caseID, **details):
+        """
+        Update an existing test case. Only the fields given are changed.
+
+        Arguments:
+            caseID {int} -- The case to update
+            **details {dict} -- The fields to change, same as addTestCase
+
+        Returns:
+            dict -- The updated case as returned by the server
+        """
+        log.trace("updateTestCase '%s', '%s'" % (caseID, details))
+        path = "update_case/%s" % caseID
+        log.debug("Path = '%s'" % path)
+        rslt = self.client.send_post(path, details)
+        log.debug(rslt)
+        return rslt
+
+    def deleteTestCase(self, caseID):
+        """
+        Delete an existing test case
+        Please note: Deleting a test case cannot be undone and also permanently deletes all
+        test results in active test runs (i.e. test runs that haven't been closed yet).
+
+        Arguments:
+            caseID {int} -- The case to delete
+
+        Returns:
+            dict -- The server response
+        """
+        log.trace("deleteTestCase '%s'" % caseID)
+        path = "delete_case/%s" % caseID
+        log.debug("Path = '%s'" % path)
+        rslt = self.client.send_post(path, {})
+        log.debug(rslt)
+        return rslt
+
+    def moveTestCases(self, suiteID, sectionID, caseIDs):
+        """
+        Move test cases to another section of the same suite
+
+        Arguments:
+            suiteID {int} -- The suite the cases belong to
+            sectionID {int} -- The section the cases are moved to
+            caseIDs {list of int} -- The cases to move
+
+        Returns:
+            dict -- The server response
+        """
+        log.trace("moveTestCases '%s', '%s', '%s'" % (suiteID, sectionID, caseIDs))
+        path = "move_cases_to_section/%s" % sectionID
+        log.debug("Path = '%s'" % path)
+        rslt = self.client.send_post(path, {"suite_id": suiteID, "case_ids": list(caseIDs)})
+        log.debug(rslt)
+        return rslt
+
+    def updateTestCases(self, suiteID, changes: Dict[int, Dict], batchSize: int = 100,
+                        limiter=None) -> List[Dict]:
+        """
+        Update many cases with as few requests as possible. Cases that get the same field
+        changes are grouped into update_cases requests of up to batchSize cases, and the
+        batches are sent concurrently.
+
+        Arguments:
+            suiteID {int} -- The suite the cases belong to
+            changes {dict} -- case ID -> {field: new value}
+
+        Keyword Arguments:
+            batchSize {int} -- Most cases per request (default: {100})
+            limiter {AdaptiveLimiter} -- Bounds the concurrent requests (default: {None})
+
+        Returns:
+            list of dict -- The server response of each batch
+
+        Raises:
+            BatchError -- Some batches failed, once all batches are done. Its outcomes tell
+                          which cases were updated
+        """
+        log.trace("updateTestCases '%s', %d cases" % (suiteID, len(changes)))
+        groups = defaultdict(list)
+        fields = {}
+        for caseID, change in changes.items():
+            key = _frozen(change)
+            groups[key].append(caseID)
+            fields[key] = change
+        bodies = []
+        for key, caseIDs in groups.items():
+            for n in range(0, len(caseIDs), batchSize):
+                body = dict(fields[key])
+                body["case_ids"] = caseIDs[n:n + batchSize]
+                bodies.append(body)
+        log.debug("%d distinct changes in %d batches" % (len(groups), len(bodies)))
+        return self.__sendBatches("update_cases/%s" % suiteID, bodies, limiter)
+
+    def setTestCaseFields(self, suiteID, caseIDs: Iterable[int], batchSize: int = 100,
+                          limiter=None, **fields) -> List[Dict]:
+        """
+        Give many cases the same field values, see updateTestCases
+
+        Arguments:
+            suiteID {int} -- The suite the cases belong to
+            caseIDs {iterable of int} -- The cases to update
+            **fields {dict} -- The fields to change
+
+        Returns:
+            list of dict -- The server response of each batch
+        """
+        log.trace("setTestCaseFields '%s', '%s'" % (suiteID, fields))
+        return self.updateTestCases(suiteID, {c: fields for c in caseIDs}, batchSize, limiter)
+
+    def deleteTestCases(self, suiteID, caseIDs: Iterable[int], projectID=None, soft: bool = False,
+                        batchSize: int = 100, limiter=None) -> List[Dict]:
+        """
+        Delete many cases with delete_cases requests of up to batchSize cases, sent
+        concurrently.
+        Please note: Deleting test cases cannot be undone and also permanently deletes all
+        their test results in active test runs. Use soft=True first to see what would go.
+
+        Arguments:
+            suiteID {int} -- The suite the cases belong to
+            caseIDs {iterable of int} -- The cases to delete
+
+        Keyword Arguments:
+            projectID {int} -- The project, required by single suite projects (default: {None})
+            soft {bool} -- Only report what would be deleted, delete nothing (default: {False})
+            batchSize {int} -- Most cases per request (default: {100})
+            limiter {AdaptiveLimiter} -- Bounds the concurrent requests (default: {None})
+
+        Returns:
+            list of dict -- The server response of each batch, for a soft delete the number
+                            of affected cases, tests and results
+
+        Raises:
+            BatchError -- Some batches failed, once all batches are done. Its outcomes tell
+                          which cases were deleted
+        """
+        caseIDs = list(caseIDs)
+        log.trace("deleteTestCases '%s', %d cases, soft=%s" % (suiteID, len(caseIDs), soft))
+        path = "delete_cases/%s" % suiteID
+        if soft:
+            path += "&soft=1"
+        bodies = []
+        for n in range(0, len(caseIDs), batchSize):
+            body = {"case_ids": caseIDs[n:n + batchSize]}
+            if projectID is not None:
+                body["project_id"] = projectID
+            bodies.append(body)
+        return self.__sendBatches(path, bodies, limiter)
+
+    def __sendBatches(self, path, bodies, limiter):
+        """
+        POST each body to path concurrently, return the responses in order
+
+        Raises:
+            BatchError -- Any batch failed, with the outcome of every batch
+        """
+        from .concurrency import AdaptiveExecutor
+        log.debug("Path = '%s', %d batches" % (path, len(bodies)))
+        with AdaptiveExecutor(limiter) as pool:
+            futures = [pool.submit(self.client.send_post, path, body) for body in bodies]
+            outcomes, errors = [], []
+            for body, future in zip(bodies, futures):
+                try:
+                    outcomes.append((body, future.result(), None))
+                except Exception as e:
+                    log.error("%s failed for %d cases: %s" % (path, len(body["case_ids"]), e))
+                    outcomes.append((body, None, e))
+                    errors.append(e)
+        if errors:
+            raise BatchError("%s failed for %d of %d batches, first error: %s" % (
+                path, len(errors), len(bodies), errors[0]), outcomes,
+                getattr(errors[0], "code", None))
+        rslt = [response for _, response, _ in outcomes]
+        log.debug(rslt)
+        return rslt
+
 
 class TestProjects(APIBase):
     """
@@ -632,9 +1312,16 @@ class TestProjects(APIBase):
         APIBase
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, projects=None, **kwargs):
+        """
+        Keyword Arguments:
+            projects {list of dict} -- Already known projects, e.g. from a MetadataSnapshot,
+                                       saves the get_projects round trip (default: {None})
+        """
         APIBase.__init__(self, *args, **kwargs)
-        self.__projIDNameMap = {k: v for k, v in [(x[u"name"], x[u"id"]) for x in self.getProjects()]}
+        if projects is None:
+            projects = self.getProjects()
+        self.__projIDNameMap = {k: v for k, v in [(x[u"name"], x[u"id"]) for x in projects]}
 
     def getProject(self, projectID):
         """
@@ -652,7 +1339,7 @@ class TestProjects(APIBase):
         Retrieve a list of projects
         """
         log.trace("getProjects")
-        rslt = self.client.send_get("get_projects")
+        rslt = list(self.client.send_get_paged("get_projects", "projects"))
         log.debug(rslt)
         return rslt
 
@@ -721,6 +1408,37 @@ class TestResults(APIBase):
 
     def __init__(self, *args, **kwargs):
         APIBase.__init__(self, *args, **kwargs)
+        self.__schemas = {}
+        self.rejected = []
+
+    def getResultFieldSchema(self, projectID) -> FieldSchema:
+        """
+        Get the result custom fields of a project compiled into a validator. The field
+        definitions are fetched and compiled once per project.
+
+        Arguments:
+            projectID {int} -- The project the results are posted to
+
+        Returns:
+            FieldSchema -- Validator for the custom_* values of result payloads
+        """
+        log.trace("getResultFieldSchema '%s'" % projectID)
+        if projectID not in self.__schemas:
+            self.__schemas[projectID] = FieldSchema(self.client.send_get("get_result_fields"), projectID)
+        return self.__schemas[projectID]
+
+    def __validate(self, details, schema):
+        """
+        Drop and log the rows that don't match the schema. The rejected rows and their
+        reasons are kept in self.rejected.
+        """
+        if schema is None:
+            self.rejected = []
+            return list(details)
+        valid, self.rejected = schema.partition(details)
+        for row, reason in self.rejected:
+            log.warning("Rejected result %s: %s" % (row, reason))
+        return valid
 
     def getTestResults(self, testID):
         """
@@ -739,20 +1457,26 @@ class TestResults(APIBase):
         log.debug(rslt)
         return rslt
 
-    def getResultsForTestRun(self, runID):
+    def getResultsForTestRun(self, runID, createdAfter=None):
         """
         Get the results for a test run
 
         Arguments:
             runID {string} -- The test run
 
+        Keyword Arguments:
+            createdAfter {int} -- Only results created after this UNIX timestamp
+                                  (default: {None})
+
         Returns:
             List of dict -- The test run info for this test run
         """
-        log.trace("getResultsForTestRun %s, %s" % runID)
+        log.trace("getResultsForTestRun %s, %s" % (runID, createdAfter))
         path = "get_results_for_run/%s" % runID
+        if createdAfter is not None:
+            path += "&created_after=%d" % createdAfter
         log.debug(path)
-        rslts = self.client.send_get(path)
+        rslts = list(self.client.send_get_paged(path, "results"))
         log.debug(rslts)
         return rslts
 
@@ -785,7 +1509,110 @@ class TestResults(APIBase):
         log.debug(rslt)
         return rslt
 
-    def postTestResultsForRun(self, runID, *details):
+    def addAttachmentToResult(self, resultID, path, progress=None):
+        """
+        Attach a file (log, screenshot, core dump..) to a test result. The file is
+        streamed, not read into memory.
+
+        Arguments:
+            resultID {int} -- The result, as returned by postTestResult & co
+            path {str} -- The file to attach
+
+        Keyword Arguments:
+            progress {callable} -- Called as progress(path, sent, total) while uploading
+                                   (default: {None})
+
+        Returns:
+            dict -- Server response {"attachment_id": ..}
+        """
+        log.trace("addAttachmentToResult '%s', '%s'" % (resultID, path))
+        uri = "add_attachment_to_result/%s" % resultID
+        log.debug(uri)
+        rslt = self.client.send_attachment(uri, path, progress)
+        log.debug(rslt)
+        return rslt
+
+    def getRunTestIndex(self, runID, refresh=False) -> RunTestIndex:
+        """
+        Get the case ID to test ID map of a run. It is fetched once and cached until the run
+        is updated through TestRun.updateTestRun, results posted to the run through this
+        class update the statuses it holds.
+
+        Arguments:
+            runID {int} -- The test run
+
+        Keyword Arguments:
+            refresh {bool} -- Fetch it again even if cached (default: {False})
+
+        Returns:
+            RunTestIndex -- The map
+        """
+        log.trace("getRunTestIndex '%s', %s" % (runID, refresh))
+        return runTestIndexes.get(self.client, runID, refresh)
+
+    def postTestResultForCase(self, runID, caseID, **details):
+        """
+        Add a result to the test of a case in a run, see postTestResult
+
+        Arguments:
+            runID {int} -- The test run
+            caseID {int} -- The case
+            **details {dict} -- Same as postTestResult
+
+        Returns:
+            dict -- Server response
+
+        Raises:
+            KeyError -- The case is not part of the run
+        """
+        log.trace("postTestResultForCase '%s', '%s', '%s'" % (runID, caseID, details))
+        index = self.getRunTestIndex(runID)
+        if index.unknown([caseID]):
+            index = self.getRunTestIndex(runID, refresh=True)
+            index.markMissing([caseID])
+        rslt = self.postTestResult(index.testID(caseID), **details)
+        runTestIndexes.update(self.client, runID, [rslt])
+        return rslt
+
+    def postTestResultsByCase(self, runID, *details, schema: FieldSchema = None):
+        """
+        Add results to a run addressed by case ID like postResults, but posted to the tests
+        with add_results, which the server handles faster for big runs. Case IDs are
+        translated with the cached run index. Rows whose case is not in the run, even after
+        one refresh of the index, are left out and kept in self.rejected. Such cases don't
+        cause another refresh for RunTestIndex.MISS_TTL seconds.
+
+        Arguments:
+            runID {int} -- The test run
+            *details {var args of dicts} -- Same as postResults, with case_id
+
+        Keyword Arguments:
+            schema {FieldSchema} -- Validate the custom fields, see postResults (default: {None})
+
+        Returns:
+            dict -- server response
+        """
+        log.trace("postTestResultsByCase '%s', %d results" % (runID, len(details)))
+        index = self.getRunTestIndex(runID)
+        unknown = index.unknown(set(d["case_id"] for d in details))
+        if unknown:
+            index = self.getRunTestIndex(runID, refresh=True)
+            index.markMissing(unknown)
+        mapped, missing = [], []
+        for d in details:
+            if d["case_id"] in index:
+                row = dict(d)
+                row["test_id"] = index.testID(row.pop("case_id"))
+                mapped.append(row)
+            else:
+                missing.append((d, "case %s is not in run %s" % (d["case_id"], runID)))
+        for row, reason in missing:
+            log.warning("Rejected result %s: %s" % (row, reason))
+        rslt = self.postTestResultsForRun(runID, *mapped, schema=schema) if mapped else []
+        self.rejected = missing + self.rejected if mapped else missing
+        return rslt
+
+    def postTestResultsForRun(self, runID, *details, schema: FieldSchema = None):
         """
         add test results for a given run. details contains a list of
         dictionaries where testID is a required field. All tests must be part of the same test run
@@ -810,17 +1637,26 @@ class TestResults(APIBase):
                                                     Optional fields:
                                                         Custom field ID's and values
 
+        Keyword Arguments:
+            schema {FieldSchema} -- When given, rows whose custom fields don't validate are
+                                    left out and kept in self.rejected, the rest is sent
+                                    (default: {None})
+
         Returns:
             dict -- server response
         """
         log.debug("postTestResultsForRun '%s', '%s'" % (runID, details))
         path = "add_results/%s" % runID
         log.debug(path)
-        rslt = self.client.send_post(path, details)
+        results = self.__validate(details, schema)
+        if not results:
+            return []
+        rslt = self.client.send_post(path, {"results": results})
         log.debug(rslt)
+        runTestIndexes.update(self.client, runID, rslt)
         return rslt
 
-    def postResults(self, runID, *details):
+    def postResults(self, runID, *details, schema: FieldSchema = None):
         """
         add test results for the given test cases in the given test run. Each result dictionary
         must contain a test case ID instead of a test ID. Details is a list of dictionaries
@@ -847,6 +1683,11 @@ class TestResults(APIBase):
                                         Optional fields:
                                             Custom field ID's and values
 
+        Keyword Arguments:
+            schema {FieldSchema} -- When given, rows whose custom fields don't validate are
+                                    left out and kept in self.rejected, the rest is sent
+                                    (default: {None})
+
         Returns:
             dict -- The server response
         """
@@ -854,6 +1695,10 @@ class TestResults(APIBase):
         log.debug("postResults '%s', '%s'" % (runID, details))
         path = "add_results_for_cases/%s" % runID
         log.debug(path)
-        rslt = self.client.send_post(path, details)
+        results = self.__validate(details, schema)
+        if not results:
+            return []
+        rslt = self.client.send_post(path, {"results": results})
         log.debug(rslt)
+        runTestIndexes.update(self.client, runID, rslt)
         return rslt
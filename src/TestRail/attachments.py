@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from .api import APIBase
+from .concurrency import AdaptiveExecutor, AdaptiveLimiter
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+import threading
+
+__all__ = ["AttachmentUploader"]
+
+
+class AttachmentUploader(APIBase):
+    """
+    Upload attachments in the background with adaptively bounded parallelism.
+
+    Files are streamed from disk by APIClient.send_attachment, so only a chunk per running
+    upload is in memory whatever the file sizes. Uploads run on their own pool and don't
+    hold up result posting; call wait() (or leave the with block) to collect them.
+
+        with AttachmentUploader(url, user, key, progress=show) as uploader:
+            uploader.toResult(resultID, "core.dump")
+            uploader.toRun(runID, "console.log")
+
+    Extends:
+        APIBase
+
+    Variables:
+        progress {callable} -- Called as progress(path, sent, total) as uploads advance
+    """
+
+    def __init__(self, baseURI: str, uname: str, apiKey: str, limiter: AdaptiveLimiter = None,
+                 progress: Callable = None, **options):
+        """
+        Arguments:
+            baseURI {str} -- Base url for the server. https://hostname:port/
+            uname {str} -- The Test Rail username to use
+            apiKey {str} -- The Test Rail API key for the user
+
+        Keyword Arguments:
+            limiter {AdaptiveLimiter} -- Bounds the uploads running at the same time, by
+                                         default a new one starting at 2 that only
+                                         backs off on errors (default: {None})
+            progress {callable} -- Called as progress(path, sent, total) (default: {None})
+            options -- codec, timeout and hedge, see APIBase
+        """
+        log.trace("AttachmentUploader.__init__")
+        APIBase.__init__(self, baseURI, uname, apiKey, **options)
+        self.progress = progress
+        # upload time follows file size, so only errors should drive the default limit
+        self.__pool = AdaptiveExecutor(limiter or AdaptiveLimiter(initial=2, maxLimit=16,
+                                                                  tolerance=float("inf")))
+        self.__lock = threading.Lock()
+        self.__uploads = []
+        self.__sent = {}
+
+    def __report(self, path, sent, total):
+        with self.__lock:
+            self.__sent[path] = (sent, total)
+        if self.progress:
+            self.progress(path, sent, total)
+
+    def __submit(self, uri, path) -> Future:
+        log.debug("Queueing %s -> %s" % (path, uri))
+        future = self.__pool.submit(self.client.send_attachment, uri, path, self.__report)
+        with self.__lock:
+            self.__uploads.append((uri, path, future))
+        return future
+
+    def toResult(self, resultID, path: str) -> Future:
+        """
+        Queue a file for attaching to a test result
+
+        Arguments:
+            resultID {int} -- The result
+            path {str} -- The file to attach
+
+        Returns:
+            Future -- Resolves to the server response {"attachment_id": ..}
+        """
+        log.trace("toResult '%s', '%s'" % (resultID, path))
+        return self.__submit("add_attachment_to_result/%s" % resultID, path)
+
+    def toRun(self, runID, path: str) -> Future:
+        """
+        Queue a file for attaching to a test run
+
+        Arguments:
+            runID {int} -- The test run
+            path {str} -- The file to attach
+
+        Returns:
+            Future -- Resolves to the server response {"attachment_id": ..}
+        """
+        log.trace("toRun '%s', '%s'" % (runID, path))
+        return self.__submit("add_attachment_to_run/%s" % runID, path)
+
+    def status(self) -> Dict[str, tuple]:
+        """
+        Progress of the uploads started so far
+
+        Returns:
+            dict -- path -> (bytes sent, total bytes)
+        """
+        with self.__lock:
+            return dict(self.__sent)
+
+    def wait(self) -> List[tuple]:
+        """
+        Wait for every queued upload to finish
+
+        Returns:
+            list of tuple -- (uri, path, error) for each upload that failed
+        """
+        log.trace("wait")
+        with self.__lock:
+            uploads, self.__uploads = self.__uploads, []
+        failed = []
+        for uri, path, future in uploads:
+            try:
+                future.result()
+            except Exception as e:
+                log.error("Attaching %s to %s failed: %s" % (path, uri, e))
+                failed.append((uri, path, e))
+        return failed
+
+    def close(self):
+        self.wait()
+        self.__pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from array import array
+from typing import Dict, Iterable
+import json
+import sys
+import zlib
+
+__all__ = ["CaseTable", "CaseRow"]
+
+
+LAZY_FIELDS = frozenset(["custom_steps_separated", "custom_steps", "custom_preconds",
+                         "custom_expected", "custom_mission", "custom_goals"])
+
+
+class _IntColumn:
+    """
+    Integers (IDs, timestamps) in a machine array of the narrowest width that holds them,
+    null stored as the smallest value of that width
+    """
+    WIDTHS = ("b", "h", "i", "q")
+
+    def __init__(self):
+        self.data = array("b")
+        self.null = -2 ** 7
+
+    def append(self, value):
+        if value is None:
+            self.data.append(self.null)
+            return
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError(value)
+        while not self.null < value < -self.null:
+            self.__widen(value)
+        self.data.append(value)
+
+    def __widen(self, value):
+        width = self.WIDTHS.index(self.data.typecode) + 1
+        if width == len(self.WIDTHS):
+            raise TypeError(value)
+        null = -2 ** (8 * array(self.WIDTHS[width]).itemsize - 1)
+        self.data = array(self.WIDTHS[width], (null if v == self.null else v for v in self.data))
+        self.null = null
+
+    def get(self, i):
+        value = self.data[i]
+        return None if value == self.null else value
+
+    def values(self):
+        return [self.get(i) for i in range(len(self.data))]
+
+    def compact(self):
+        return self
+
+
+class _DictColumn:
+    """
+    Dictionary encoded scalars: each distinct value is stored once and rows hold a code.
+    Mostly unique values (titles) are packed into a _BlobColumn on compact instead. Values
+    are indexed together with their type so that 1, 1.0 and True, which are equal and hash
+    the same, keep codes of their own.
+    """
+
+    def __init__(self):
+        self.codes = array("I")
+        self.distinct = []
+        self.index = {}
+
+    def append(self, value):
+        if self.index is None:
+            self.index = {(type(v), v): n for n, v in enumerate(self.distinct)}
+        key = (type(value), value)
+        code = self.index.get(key)
+        if code is None:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            code = self.index[key] = len(self.distinct)
+            self.distinct.append(value)
+        self.codes.append(code)
+
+    def get(self, i):
+        return self.distinct[self.codes[i]]
+
+    def values(self):
+        return [self.distinct[c] for c in self.codes]
+
+    def compact(self):
+        if len(self.distinct) > len(self.codes) // 2 and len(self.distinct) > 1000:
+            packed = _BlobColumn()
+            for value in self.values():
+                packed.append(value)
+            return packed
+        self.index = None
+        return self
+
+
+class _BlobColumn:
+    """
+    Large or structured values kept as JSON in one shared buffer and only decoded when
+    accessed, null is stored as an empty slice. The first SAMPLE values are kept as is and
+    then used as a preset dictionary to deflate the rest, which makes even short values
+    compress well since steps, preconditions etc. repeat a lot between cases.
+    """
+    SAMPLE = 64
+    COMPRESS_OVER = 32
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array("q", [0])
+        self.zdict = None
+
+    def append(self, value):
+        if value is not None:
+            blob = json.dumps(value, separators=(",", ":")).encode("utf-8")
+            if self.zdict is not None and len(blob) > self.COMPRESS_OVER:
+                deflate = zlib.compressobj(6, zlib.DEFLATED, -15, zdict=self.zdict)
+                blob = b"z" + deflate.compress(blob) + deflate.flush()
+            self.buffer += blob
+        self.offsets.append(len(self.buffer))
+        if self.zdict is None and len(self.offsets) > self.SAMPLE and self.buffer:
+            self.zdict = bytes(self.buffer[-32768:])
+
+    def get(self, i):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        if start == end:
+            return None
+        blob = bytes(self.buffer[start:end])
+        if blob[:1] == b"z":
+            blob = zlib.decompressobj(-15, zdict=self.zdict).decompress(blob[1:])
+        return json.loads(blob.decode("utf-8"))
+
+    def values(self):
+        return [self.get(i) for i in range(len(self.offsets) - 1)]
+
+    def compact(self):
+        return self
+
+
+class CaseRow:
+    """
+    A lightweight view of one case of a CaseTable. Fields are read with attribute syntax
+    like the namedtuples returned by TestCases.getTestCases, large fields are decoded on
+    every access rather than kept.
+    """
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getattr__(self, name):
+        try:
+            return self._table.value(self._index, name)
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self._table.value(self._index, name)
+
+    def get(self, name, default=None):
+        try:
+            return self._table.value(self._index, name)
+        except KeyError:
+            return default
+
+    def asdict(self) -> Dict:
+        return {name: self._table.value(self._index, name) for name in self._table.fields}
+
+    def __repr__(self):
+        return "CaseRow(%r)" % self.asdict()
+
+
+class CaseTable:
+    """
+    Column oriented storage for large numbers of test cases.
+
+    Each field is kept in one column: integers in machine arrays, repeated scalars such as
+    refs, estimates and dropdown values dictionary encoded, and the large text or structured
+    fields (steps, preconditions, ..) as deflated JSON that is decoded only when read.
+    Rows are accessed through CaseRow views. Suites of 100k+ cases fit in a small fraction of
+    the memory a list of dicts or namedtuples needs.
+
+    Variables:
+        lazyFields {frozenset} -- Fields stored packed and decoded on access
+    """
+
+    def __init__(self, rows: Iterable[Dict] = (), lazyFields=LAZY_FIELDS):
+        """
+        Keyword Arguments:
+            rows {iterable of dict} -- Cases to load, e.g. from send_get_paged (default: {()})
+            lazyFields {iterable of str} -- Fields stored packed (default: {LAZY_FIELDS})
+        """
+        self.lazyFields = frozenset(lazyFields)
+        self.__columns = {}
+        self.__length = 0
+        self.__ids = None
+        self.extend(rows)
+
+    @property
+    def fields(self):
+        return list(self.__columns)
+
+    def __newColumn(self, name, value):
+        if name in self.lazyFields or isinstance(value, (list, dict)):
+            return _BlobColumn()
+        if value is None or isinstance(value, int) and not isinstance(value, bool):
+            return _IntColumn()
+        return _DictColumn()
+
+    def __widen(self, name, column):
+        """
+        Replace a column that can't hold a new value with a more general one
+        """
+        wider = _DictColumn() if isinstance(column, _IntColumn) else _BlobColumn()
+        for value in column.values():
+            wider.append(value)
+        self.__columns[name] = wider
+        return wider
+
+    def append(self, row: Dict):
+        """
+        Add one case
+
+        Arguments:
+            row {dict} -- The case as returned by the server
+        """
+        for name, value in row.items():
+            if name not in self.__columns:
+                column = self.__columns[name] = self.__newColumn(name, value)
+                for _ in range(self.__length):
+                    column.append(None)
+        for name, column in self.__columns.items():
+            value = row.get(name)
+            while True:
+                try:
+                    column.append(value)
+                    break
+                except TypeError:
+                    column = self.__widen(name, column)
+        self.__length += 1
+        self.__ids = None
+
+    def extend(self, rows: Iterable[Dict]):
+        """
+        Add many cases. Only one row is held as a dict at a time, so passing a generator
+        such as APIClient.send_get_paged keeps peak memory low.
+
+        Arguments:
+            rows {iterable of dict} -- The cases to add
+        """
+        for row in rows:
+            if row:
+                self.append(row)
+        self.compact()
+        log.debug("CaseTable holds %d cases in %d columns" % (self.__length, len(self.__columns)))
+
+    def compact(self):
+        """
+        Drop the encoding indexes that are only needed while loading and pack mostly unique
+        string columns. Indexes are rebuilt if more rows are appended later.
+        """
+        for name, column in list(self.__columns.items()):
+            self.__columns[name] = column.compact()
+
+    def value(self, index: int, name: str):
+        """
+        Read a single field of a single case
+
+        Arguments:
+            index {int} -- The row number
+            name {str} -- The field name
+
+        Returns:
+            The field value
+
+        Raises:
+            KeyError -- No case has that field
+        """
+        return self.__columns[name].get(index)
+
+    def column(self, name: str) -> list:
+        """
+        All the values of one field, in row order
+
+        Arguments:
+            name {str} -- The field name
+
+        Returns:
+            list -- The decoded values
+        """
+        return self.__columns[name].values()
+
+    def byID(self, caseID: int) -> CaseRow:
+        """
+        Look a case up by its ID
+
+        Arguments:
+            caseID {int} -- The case ID
+
+        Returns:
+            CaseRow -- The case
+
+        Raises:
+            KeyError -- No such case in the table
+        """
+        if self.__ids is None:
+            self.__ids = {c: n for n, c in enumerate(self.column("id"))}
+        return CaseRow(self, self.__ids[caseID])
+
+    def __len__(self):
+        return self.__length
+
+    def __getitem__(self, index: int) -> CaseRow:
+        if index < 0:
+            index += self.__length
+        if not 0 <= index < self.__length:
+            raise IndexError(index)
+        return CaseRow(self, index)
+
+    def __iter__(self):
+        for n in range(self.__length):
+            yield CaseRow(self, n)
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Post JUnit/xUnit XML reports to a TestRail run.
+
+    python -m TestRail --project-id 1 --suite-id 2 --run-id 3 reports/ more/*.xml
+
+Report files are parsed incrementally in a process pool, each test is mapped to a case
+(a "C1234" tag in the test name, otherwise the case title or another key field), and the
+mapped results are uploaded in chunks with add_results_for_cases while parsing continues.
+"""
+from __future__ import unicode_literals, print_function
+from . import log
+from .api import DEFAULT_TIMEOUT, TestCases, TestResults
+from .concurrency import AdaptiveExecutor, AdaptiveLimiter
+from .deadline import DeadlineExceeded, deadline
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Tuple
+from xml.etree.ElementTree import iterparse, ParseError
+import argparse
+import glob
+import math
+import os
+import re
+import sys
+import time
+
+__all__ = ["main", "parseReport", "findReports", "CaseIndex"]
+
+
+PASSED = 1
+BLOCKED = 2
+RETEST = 4
+FAILED = 5
+
+CASE_TAG = re.compile(r"(?<![A-Za-z0-9])C(\d+)(?![0-9])")
+
+REPORT_ROOTS = frozenset(["testsuites", "testsuite", "assemblies", "assembly"])
+XUNIT_OUTCOMES = {"Pass": "passed", "Fail": "failed", "Skip": "skipped", "NotRun": "skipped"}
+
+TestOutcome = Tuple[str, str, str, float, str]
+
+
+def parseReport(path: str) -> Tuple[str, List[TestOutcome], str]:
+    """
+    Parse one JUnit or xUnit v2 report without building the whole tree. Each JUnit
+    <testcase> or xUnit <test> element is dropped as soon as it has been read. A file
+    that is neither kind of report is returned as an error rather than as having no tests.
+
+    Arguments:
+        path {str} -- The report file
+
+    Returns:
+        tuple -- (path, [(name, classname, outcome, seconds, message)], error or None)
+                 outcome is one of passed, failed, skipped
+    """
+    outcomes = []
+    root = None
+    try:
+        for event, elem in iterparse(path, events=("end",)):
+            root = elem.tag
+            if elem.tag == "testcase":
+                outcome, message = junitOutcome(elem)
+                classname = elem.get("classname", "")
+            elif elem.tag == "test" and elem.get("result") in XUNIT_OUTCOMES:
+                outcome, message = xunitOutcome(elem)
+                classname = elem.get("type", "")
+            else:
+                if elem.tag in REPORT_ROOTS or elem.tag == "collection":
+                    elem.clear()
+                continue
+            try:
+                seconds = float(elem.get("time") or 0)
+            except ValueError:
+                seconds = 0.0
+            outcomes.append((elem.get("name", ""), classname, outcome, seconds, message[:4000]))
+            elem.clear()
+    except (ParseError, IOError) as e:
+        return path, outcomes, str(e)
+    if not outcomes and root not in REPORT_ROOTS:
+        return path, outcomes, "not a JUnit or xUnit report (root element <%s>)" % root
+    return path, outcomes, None
+
+
+def junitOutcome(elem) -> Tuple[str, str]:
+    outcome, message = "passed", ""
+    for child in elem:
+        if child.tag in ("failure", "error"):
+            return "failed", child.get("message") or (child.text or "").strip()
+        if child.tag == "skipped":
+            outcome, message = "skipped", child.get("message") or ""
+    return outcome, message
+
+
+def xunitOutcome(elem) -> Tuple[str, str]:
+    outcome = XUNIT_OUTCOMES[elem.get("result")]
+    if outcome == "failed":
+        message = elem.find("failure/message")
+    else:
+        message = elem.find("reason")
+    return outcome, (message.text or "").strip() if message is not None else ""
+
+
+def findReports(paths: Iterable[str]) -> List[str]:
+    """
+    Expand files, directories (searched recursively for *.xml) and glob patterns
+
+    Arguments:
+        paths {iterable of str} -- Command line arguments
+
+    Returns:
+        list of str -- The report files
+    """
+    rslt = []
+    for p in paths:
+        if os.path.isdir(p):
+            rslt.extend(sorted(glob.glob(os.path.join(p, "**", "*.xml"), recursive=True)))
+        elif os.path.exists(p):
+            rslt.append(p)
+        else:
+            rslt.extend(sorted(glob.glob(p, recursive=True)))
+    return rslt
+
+
+class CaseIndex:
+    """
+    Map test names to case IDs. A "C1234" tag in the test name wins, otherwise the name,
+    then "classname.name", is looked up in the key field of the suite's cases.
+    """
+
+    def __init__(self, caseIDs: Iterable[int], keys: Iterable[str]):
+        """
+        Arguments:
+            caseIDs {iterable of int} -- The case IDs of the suite
+            keys {iterable of str} -- The key field value of each case, in the same order
+        """
+        self.ids = set()
+        self.byKey = {}
+        for caseID, key in zip(caseIDs, keys):
+            self.ids.add(caseID)
+            if key:
+                self.byKey[key.strip()] = caseID
+        log.debug("CaseIndex holds %d cases, %d keys" % (len(self.ids), len(self.byKey)))
+
+    def lookup(self, name: str, classname: str = "") -> int:
+        """
+        Arguments:
+            name {str} -- The test name
+            classname {str} -- The test class name (default: {""})
+
+        Returns:
+            int -- The case ID, None if the test can't be mapped
+        """
+        m = CASE_TAG.search(name)
+        if m and int(m.group(1)) in self.ids:
+            return int(m.group(1))
+        caseID = self.byKey.get(name)
+        if caseID is None and classname:
+            caseID = self.byKey.get(qualified(name, classname))
+        return caseID
+
+
+def qualified(name: str, classname: str) -> str:
+    """
+    "classname.name", unless the name already starts with the class name as xUnit names do
+    """
+    if not classname or name.startswith(classname + "."):
+        return name
+    return "%s.%s" % (classname, name)
+
+
+def elapsed(seconds: float) -> str:
+    """
+    Format a duration the way TestRail accepts it, whole seconds and at least 1s
+    """
+    return "%ds" % max(1, int(math.ceil(seconds)))
+
+
+def toResult(caseID: int, outcome: TestOutcome, statuses: Dict[str, int], version: str) -> Dict:
+    name, classname, status, seconds, message = outcome
+    result = {"case_id": caseID, "status_id": statuses[status], "elapsed": elapsed(seconds)}
+    if message:
+        result["comment"] = message
+    if version:
+        result["version"] = version
+    return result
+
+
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(prog="python -m TestRail",
+                                     description="Post JUnit/xUnit XML reports to a TestRail run.")
+    parser.add_argument("reports", nargs="+", help="report files, directories or glob patterns")
+    parser.add_argument("--url", default=os.environ.get("TESTRAIL_URL"),
+                        help="TestRail server (default: $TESTRAIL_URL)")
+    parser.add_argument("--user", default=os.environ.get("TESTRAIL_USER"),
+                        help="TestRail user (default: $TESTRAIL_USER)")
+    parser.add_argument("--key", default=os.environ.get("TESTRAIL_KEY"),
+                        help="TestRail API key (default: $TESTRAIL_KEY)")
+    parser.add_argument("--project-id", type=int, required=True)
+    parser.add_argument("--suite-id", type=int, required=True)
+    parser.add_argument("--run-id", type=int, required=True)
+    parser.add_argument("--key-field", default="title",
+                        help="case field matched against test names (default: title)")
+    parser.add_argument("--version", default="", help="version or build tested")
+    parser.add_argument("--skipped-status", type=int, default=RETEST,
+                        help="status ID posted for skipped tests, 0 to leave them out (default: 4)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="parser processes (default: number of CPUs)")
+    parser.add_argument("--max-uploads", type=int, default=16,
+                        help="upper bound of the adaptive upload concurrency (default: 16)")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="results per add_results_for_cases request (default: 1000)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds each request may take (default: %d)" % DEFAULT_TIMEOUT)
+    parser.add_argument("--deadline", type=float, default=0,
+                        help="give up on uploads after that many seconds, 0 for no limit (default: 0)")
+    parser.add_argument("--show-unmapped", type=int, default=20,
+                        help="number of unmapped tests listed at the end (default: 20)")
+    args = parser.parse_args(argv)
+    for name in ("url", "user", "key"):
+        if not getattr(args, name):
+            parser.error("--%s is required" % name)
+    return args
+
+
+def main(argv=None) -> int:
+    args = parseArgs(argv)
+    if not args.deadline:
+        return ingest(args)
+    try:
+        with deadline(args.deadline):
+            return ingest(args)
+    except DeadlineExceeded as e:
+        print("gave up: %s" % e, file=sys.stderr)
+        return 2
+
+
+def ingest(args) -> int:
+    started = time.time()
+    reports = findReports(args.reports)
+    log.info("Posting %d reports to run %s" % (len(reports), args.run_id))
+
+    cases = TestCases(args.url, args.user, args.key, timeout=args.timeout).getCaseTable(
+        args.project_id, args.suite_id)
+    if len(cases) and args.key_field not in cases.fields:
+        print("python -m TestRail: error: --key-field: the cases of suite %s have no field '%s'"
+              % (args.suite_id, args.key_field), file=sys.stderr)
+        return 2
+    index = CaseIndex(cases.column("id"), cases.column(args.key_field) if len(cases) else [])
+    del cases
+    results = TestResults(args.url, args.user, args.key, timeout=args.timeout)
+    statuses = {"passed": PASSED, "failed": FAILED, "skipped": args.skipped_status}
+
+    tests = mapped = posted = 0
+    unmapped, errors, uploads, pending = [], [], [], []
+    with ProcessPoolExecutor(max_workers=args.workers) as parsers, \
+            AdaptiveExecutor(AdaptiveLimiter(initial=2, maxLimit=args.max_uploads)) as uploaders:
+        for parsed in as_completed([parsers.submit(parseReport, p) for p in reports]):
+            path, outcomes, error = parsed.result()
+            if error:
+                log.error("%s: %s" % (path, error))
+                errors.append((path, error))
+            for outcome in outcomes:
+                tests += 1
+                caseID = index.lookup(outcome[0], outcome[1])
+                if caseID is None:
+                    unmapped.append(qualified(outcome[0], outcome[1]))
+                    continue
+                mapped += 1
+                if not statuses[outcome[2]]:
+                    continue
+                pending.append(toResult(caseID, outcome, statuses, args.version))
+                if len(pending) >= args.chunk_size:
+                    uploads.append(uploaders.submit(results.postResults, args.run_id, *pending))
+                    posted += len(pending)
+                    pending = []
+        if pending:
+            uploads.append(uploaders.submit(results.postResults, args.run_id, *pending))
+            posted += len(pending)
+        failed = 0
+        for upload in uploads:
+            try:
+                upload.result()
+            except Exception as e:
+                failed += 1
+                log.error("Upload failed: %s" % e)
+                print("upload failed: %s" % e, file=sys.stderr)
+
+    duration = time.time() - started
+    print("reports:   %d (%d unreadable)" % (len(reports), len(errors)))
+    print("tests:     %d in %.1fs, %.0f tests/s" % (tests, duration, tests / duration if duration else 0))
+    print("mapped:    %d" % mapped)
+    print("posted:    %d in %d requests (%d failed)" % (posted, len(uploads), failed))
+    metrics = uploaders.limiter.metrics()
+    print("uploads:   concurrency limit %d, %d increases, %d decreases" % (
+        metrics["limit"], metrics["increases"], metrics["decreases"]))
+    print("unmapped:  %d" % len(unmapped))
+    for name in unmapped[:args.show_unmapped]:
+        print("    %s" % name)
+    if len(unmapped) > args.show_unmapped:
+        print("    ... and %d more" % (len(unmapped) - args.show_unmapped))
+    for path, error in errors:
+        print("unreadable: %s: %s" % (path, error), file=sys.stderr)
+    return 1 if failed or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from typing import Any
+import json
+
+__all__ = ["JSONCodec", "OrjsonCodec", "MsgspecCodec", "UjsonCodec", "getCodec"]
+
+
+class JSONCodec:
+    """
+    Encodes request bodies and decodes responses. This is the standard library codec,
+    the subclasses below use faster backends when they are installed.
+
+    Variables:
+        name {str} -- Backend name
+    """
+    name = "json"
+
+    def encode(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, payload: bytes) -> Any:
+        return json.loads(payload)
+
+
+def _tupleAsList(obj):
+    # namedtuples, such as the records this library returns, encode as arrays like json does
+    if isinstance(obj, tuple):
+        return list(obj)
+    raise TypeError("Type is not JSON serializable: %s" % type(obj).__name__)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    orjson encodes whatever the standard library codec does: non string keys are turned
+    into strings, namedtuples into arrays, and anything else it rejects is handed to
+    JSONCodec
+    """
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self.__dumps = orjson.dumps
+        self.__option = orjson.OPT_NON_STR_KEYS
+        self.decode = orjson.loads
+
+    def encode(self, obj: Any) -> bytes:
+        try:
+            return self.__dumps(obj, default=_tupleAsList, option=self.__option)
+        except TypeError:
+            return JSONCodec.encode(self, obj)
+
+
+class MsgspecCodec(JSONCodec):
+    """
+    Values msgspec can't encode are handed to JSONCodec
+    """
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+        self.__encode = msgspec.json.Encoder(enc_hook=_tupleAsList).encode
+        self.decode = msgspec.json.Decoder().decode
+
+    def encode(self, obj: Any) -> bytes:
+        try:
+            return self.__encode(obj)
+        except TypeError:
+            return JSONCodec.encode(self, obj)
+
+
+class UjsonCodec(JSONCodec):
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self.__ujson = ujson
+
+    def encode(self, obj: Any) -> bytes:
+        try:
+            return self.__ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+        except TypeError:
+            return JSONCodec.encode(self, obj)
+
+    def decode(self, payload: bytes) -> Any:
+        return self.__ujson.loads(payload)
+
+
+CODECS = (OrjsonCodec, MsgspecCodec, UjsonCodec, JSONCodec)
+
+
+def getCodec(name: str = None) -> JSONCodec:
+    """
+    Get a codec by name, or the fastest one that is installed
+
+    Keyword Arguments:
+        name {str} -- orjson, msgspec, ujson or json (default: {None})
+
+    Returns:
+        JSONCodec -- The codec
+
+    Raises:
+        ValueError -- The named codec is unknown
+        ImportError -- The named codec's backend isn't installed
+    """
+    for codec in CODECS:
+        if name is not None and codec.name != name:
+            continue
+        try:
+            rslt = codec()
+        except ImportError:
+            if name is not None:
+                raise
+            continue
+        log.debug("Using the %s codec" % rslt.name)
+        return rslt
+    raise ValueError("Unknown codec '%s'" % name)
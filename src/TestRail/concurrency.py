@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from .api import APIError
+from .deadline import DeadlineExceeded, activate, current
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List
+import socket
+import threading
+import time
+import urllib2
+
+__all__ = ["isOverload", "AdaptiveLimiter", "AdaptiveExecutor"]
+
+
+OVERLOAD_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+def isOverload(error: Exception) -> bool:
+    """
+    Whether an error means the server is struggling (throttling, 5xx, timeouts, dropped
+    connections) as opposed to a bad request or a local problem such as a missing file
+    """
+    if isinstance(error, APIError):
+        return getattr(error, "code", None) in OVERLOAD_CODES
+    if isinstance(error, DeadlineExceeded):
+        return False
+    return isinstance(error, (socket.timeout, ConnectionError, urllib2.URLError))
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit driven by observed latency and errors.
+
+    The lowest latency seen is taken as the unloaded latency of the server. It is slowly
+    forgotten (raised by FORGET per request, never above the latest sample) so the baseline
+    follows the server when it gets slower for good. While the smoothed latency stays within
+    `tolerance` times that baseline the limit grows by about one per limit's worth of
+    completed requests (additive increase). When latency climbs above it, or a request
+    fails with an overload error, the limit is multiplied by `backoff` (multiplicative
+    decrease), at most once per smoothed latency so that one burst of slow responses counts
+    as one signal.
+
+    Variables:
+        limit {float} -- The current concurrency limit
+        inflight {int} -- Requests currently holding a slot
+        decisions {deque} -- The last changes as (time, old limit, new limit, reason)
+    """
+    FORGET = 1.0005
+
+    def __init__(self, initial: int = 4, minLimit: int = 1, maxLimit: int = 64,
+                 tolerance: float = 2.0, backoff: float = 0.7, smoothing: float = 0.2):
+        """
+        Keyword Arguments:
+            initial {int} -- Starting limit (default: {4})
+            minLimit {int} -- Never go below (default: {1})
+            maxLimit {int} -- Never go above (default: {64})
+            tolerance {float} -- Latency / baseline ratio considered flat (default: {2.0})
+            backoff {float} -- Factor applied to the limit on congestion (default: {0.7})
+            smoothing {float} -- Weight of a new sample in the latency average (default: {0.2})
+        """
+        self.limit = float(initial)
+        self.minLimit = minLimit
+        self.maxLimit = maxLimit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.inflight = 0
+        self.decisions = deque(maxlen=100)
+        self.__baseline = None
+        self.__latency = None
+        self.__lastDecrease = 0.0
+        self.__counts = {"requests": 0, "errors": 0, "overloads": 0, "increases": 0, "decreases": 0}
+        self.__cond = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait for a free slot, no longer than the current deadline
+
+        Raises:
+            DeadlineExceeded -- The deadline passed while waiting
+        """
+        d = current()
+        with self.__cond:
+            while self.inflight >= int(self.limit):
+                if d is None:
+                    self.__cond.wait()
+                else:
+                    d.check()
+                    self.__cond.wait(d.remaining())
+            self.inflight += 1
+
+    def release(self, latency: float, error: Exception = None):
+        """
+        Give a slot back and feed the outcome of the request into the limit
+
+        Arguments:
+            latency {float} -- Seconds the request took
+
+        Keyword Arguments:
+            error {Exception} -- The error the request failed with (default: {None})
+        """
+        with self.__cond:
+            self.inflight -= 1
+            self.__counts["requests"] += 1
+            if error is not None:
+                self.__counts["errors"] += 1
+            if error is not None and isOverload(error):
+                self.__counts["overloads"] += 1
+                self.__decrease("overload: %s" % error)
+            elif error is None:
+                if self.__latency is None:
+                    self.__latency = self.__baseline = latency
+                self.__baseline = min(latency, self.__baseline * self.FORGET)
+                self.__latency += self.smoothing * (latency - self.__latency)
+                if self.__latency > self.tolerance * self.__baseline:
+                    self.__decrease("latency %.3fs > %.1f x %.3fs" % (
+                        self.__latency, self.tolerance, self.__baseline))
+                elif self.limit < self.maxLimit and self.inflight + 1 >= int(self.limit) // 2:
+                    self.__set(min(self.maxLimit, self.limit + 1.0 / self.limit), None)
+            self.__cond.notify_all()
+
+    def __decrease(self, reason):
+        now = time.time()
+        if now - self.__lastDecrease < (self.__latency or 0):
+            return
+        self.__lastDecrease = now
+        self.__set(max(self.minLimit, self.limit * self.backoff), reason)
+
+    def __set(self, limit, reason):
+        old = int(self.limit)
+        self.limit = limit
+        if int(limit) != old:
+            reason = reason or "latency flat"
+            self.__counts["increases" if int(limit) > old else "decreases"] += 1
+            self.decisions.append((time.time(), old, int(limit), reason))
+            log.debug("Concurrency limit %d -> %d (%s)" % (old, int(limit), reason))
+
+    @contextmanager
+    def slot(self):
+        """
+        Hold a slot for the duration of a with block, timing it and recording any error
+        """
+        self.acquire()
+        started = time.time()
+        try:
+            yield
+        except Exception as e:
+            self.release(time.time() - started, e)
+            raise
+        self.release(time.time() - started)
+
+    def metrics(self) -> Dict:
+        """
+        Returns:
+            dict -- limit, inflight, smoothed and baseline latency, request/error/
+                    increase/decrease counters and the recent decisions as (time, old
+                    limit, new limit, reason)
+        """
+        with self.__cond:
+            rslt = dict(self.__counts)
+            rslt.update(limit=int(self.limit), inflight=self.inflight, latency=self.__latency,
+                        baseline=self.__baseline, decisions=list(self.decisions))
+            return rslt
+
+
+class AdaptiveExecutor:
+    """
+    Runs calls on a thread pool with parallelism bounded by an AdaptiveLimiter rather than
+    a fixed worker count. Several executors may share one limiter so that all the bulk work
+    against a server adapts together. The deadline in force when a call is submitted
+    applies to it on the worker thread, calls still queued when it passes fail with
+    DeadlineExceeded without being started.
+
+        with AdaptiveExecutor() as pool:
+            futures = [pool.submit(cases.updateTestCase, i, **changes) for i in ids]
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter = None):
+        """
+        Keyword Arguments:
+            limiter {AdaptiveLimiter} -- The limit to obey, a new one by default (default: {None})
+        """
+        self.limiter = limiter or AdaptiveLimiter()
+        self.__pool = ThreadPoolExecutor(max_workers=self.limiter.maxLimit)
+
+    def __run(self, d, fn, args, kwargs):
+        if d is None:
+            with self.limiter.slot():
+                return fn(*args, **kwargs)
+        with activate(d):
+            d.check()
+            with self.limiter.slot():
+                return fn(*args, **kwargs)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        return self.__pool.submit(self.__run, current(), fn, args, kwargs)
+
+    def map(self, fn: Callable, items: Iterable) -> List:
+        """
+        Call fn on every item and return the results in order, raising the first error
+        """
+        return [f.result() for f in [self.submit(fn, item) for item in items]]
+
+    def shutdown(self, wait: bool = True):
+        self.__pool.shutdown(wait)
+        log.debug("Executor done: %s" % self.limiter.metrics())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Deadlines for whole operations.
+
+    from TestRail.deadline import deadline
+
+    with deadline(30):
+        cases = TestCases(url, user, key).getTestCases(1, 2)
+
+Every request made inside the block, including the pages of paginated reads and work
+handed to an AdaptiveExecutor, gets the time that is left as its timeout. Once the time is
+up no further request is started and DeadlineExceeded is raised. Nested blocks can only
+shorten the deadline.
+
+Only Deadline, DeadlineExceeded and timeoutFor are exported to the package namespace, so
+TestRail.deadline stays this module.
+"""
+from __future__ import unicode_literals
+from . import log
+from contextlib import contextmanager
+import threading
+import time
+
+__all__ = ["Deadline", "DeadlineExceeded", "timeoutFor"]
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """
+    A point in time by which an operation has to be done
+
+    Variables:
+        expires {float} -- time.monotonic() value of the deadline
+    """
+
+    def __init__(self, seconds: float):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        """
+        Raises:
+            DeadlineExceeded -- The deadline has passed
+        """
+        if self.expired():
+            raise DeadlineExceeded("Deadline exceeded by %.3fs" % -self.remaining())
+
+    def __repr__(self):
+        return "Deadline(%.3fs left)" % self.remaining()
+
+
+_local = threading.local()
+
+
+def current() -> Deadline:
+    """
+    The deadline in force on this thread, None when there is none
+    """
+    return getattr(_local, "deadline", None)
+
+
+@contextmanager
+def activate(d: Deadline):
+    """
+    Put an existing deadline in force on this thread, for handing a deadline to worker
+    threads
+    """
+    outer = current()
+    _local.deadline = d
+    try:
+        yield d
+    finally:
+        _local.deadline = outer
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Put a deadline of `seconds` from now in force for the with block, unless an enclosing
+    one expires earlier
+
+    Arguments:
+        seconds {float} -- The time budget of the block
+    """
+    d = Deadline(seconds)
+    outer = current()
+    if outer is not None and outer.expires < d.expires:
+        d = outer
+    log.debug("Operation %s" % d)
+    with activate(d):
+        yield d
+
+
+def timeoutFor(default: float = None) -> float:
+    """
+    The timeout to give the next request: the time left before the current deadline, or
+    `default` when that is shorter or there is no deadline
+
+    Keyword Arguments:
+        default {float} -- The per-call timeout (default: {None})
+
+    Returns:
+        float -- seconds, None for no timeout
+
+    Raises:
+        DeadlineExceeded -- The current deadline has passed
+    """
+    d = current()
+    if d is None:
+        return default
+    d.check()
+    remaining = d.remaining()
+    return remaining if default is None else min(default, remaining)
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from typing import Callable, Dict, Iterable, List, Tuple
+import datetime
+
+__all__ = ["FieldValidationError", "FieldSchema", "parseItems"]
+
+
+STRING = 1
+INTEGER = 2
+TEXT = 3
+URL = 4
+CHECKBOX = 5
+DROPDOWN = 6
+USER = 7
+DATE = 8
+MILESTONE = 9
+STEPS = 10
+STEP_RESULTS = 11
+MULTI_SELECT = 12
+
+
+class FieldValidationError(Exception):
+    pass
+
+
+def parseItems(items: str) -> Dict[str, int]:
+    """
+    Parse the option list of a dropdown or multi-select field
+
+    Arguments:
+        items {str} -- The "items" config option, one "id, label" pair per line
+
+    Returns:
+        dict -- label -> option ID
+    """
+    rslt = {}
+    for line in (items or "").splitlines():
+        if "," in line:
+            optionID, label = line.split(",", 1)
+            rslt[label.strip()] = int(optionID)
+    return rslt
+
+
+def _text(name):
+    def coerce(value):
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise FieldValidationError("%s: expected text, got %r" % (name, value))
+        return value if isinstance(value, str) else str(value)
+    return coerce
+
+
+def _integer(name):
+    def coerce(value):
+        if isinstance(value, bool):
+            raise FieldValidationError("%s: expected integer, got %r" % (name, value))
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise FieldValidationError("%s: expected integer, got %r" % (name, value))
+    return coerce
+
+
+def _id(name):
+    toInt = _integer(name)
+
+    def coerce(value):
+        value = toInt(value)
+        if value <= 0:
+            raise FieldValidationError("%s: expected an ID, got %r" % (name, value))
+        return value
+    return coerce
+
+
+def _url(name):
+    def coerce(value):
+        if not isinstance(value, str) or not value.startswith(("http://", "https://")):
+            raise FieldValidationError("%s: expected http(s) URL, got %r" % (name, value))
+        return value
+    return coerce
+
+
+def _checkbox(name):
+    truth = {True: True, False: False, 1: True, 0: False, "1": True, "0": False,
+             "true": True, "false": False}
+
+    def coerce(value):
+        key = value.lower() if isinstance(value, str) else value
+        try:
+            return truth[key]
+        except (KeyError, TypeError):
+            raise FieldValidationError("%s: expected boolean, got %r" % (name, value))
+    return coerce
+
+
+def _date(name):
+    def coerce(value):
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.strftime("%m/%d/%Y")
+        if not isinstance(value, str) or not value:
+            raise FieldValidationError("%s: expected date, got %r" % (name, value))
+        return value
+    return coerce
+
+
+def _option(name, options):
+    ids = frozenset(options.values())
+
+    def coerce(value):
+        if isinstance(value, str):
+            if value in options:
+                return options[value]
+            if value.isdigit() and int(value) in ids:
+                return int(value)
+        elif isinstance(value, float) and value.is_integer() and int(value) in ids:
+            return int(value)
+        elif isinstance(value, int) and not isinstance(value, bool) and value in ids:
+            return value
+        raise FieldValidationError("%s: %r is not a valid option" % (name, value))
+    return coerce
+
+
+def _multiSelect(name, options):
+    option = _option(name, options)
+
+    def coerce(value):
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            value = [value]
+        return [option(v) for v in value]
+    return coerce
+
+
+def _steps(name, keys, statusRequired):
+    statusID = _id(name)
+
+    def coerce(value):
+        if not isinstance(value, (list, tuple)):
+            raise FieldValidationError("%s: expected a list of steps, got %r" % (name, value))
+        rslt = []
+        for n, step in enumerate(value, 1):
+            if not isinstance(step, dict) or not step.get("content"):
+                raise FieldValidationError("%s: step %d has no content" % (name, n))
+            wire = {k: step[k] if isinstance(step[k], str) else str(step[k])
+                    for k in keys if step.get(k) is not None}
+            if "status_id" in step:
+                wire["status_id"] = statusID(step["status_id"])
+            elif statusRequired:
+                raise FieldValidationError("%s: step %d has no status_id" % (name, n))
+            rslt.append(wire)
+        return rslt
+    return coerce
+
+
+def _compileField(definition: Dict, options: Dict) -> Callable:
+    name = definition["system_name"]
+    typeID = definition["type_id"]
+    if typeID in (STRING, TEXT):
+        return _text(name)
+    if typeID == INTEGER:
+        return _integer(name)
+    if typeID == URL:
+        return _url(name)
+    if typeID == CHECKBOX:
+        return _checkbox(name)
+    if typeID in (USER, MILESTONE):
+        return _id(name)
+    if typeID == DATE:
+        return _date(name)
+    if typeID == DROPDOWN:
+        return _option(name, parseItems(options.get("items")))
+    if typeID == MULTI_SELECT:
+        return _multiSelect(name, parseItems(options.get("items")))
+    if typeID == STEPS:
+        return _steps(name, ("content", "expected", "additional_info", "refs"), False)
+    if typeID == STEP_RESULTS:
+        return _steps(name, ("content", "expected", "actual"), True)
+    log.warning("Unknown field type %s for '%s', passing values through" % (typeID, name))
+    return lambda value: value
+
+
+class FieldSchema:
+    """
+    Custom field definitions compiled into per field validators for one project.
+
+    Each custom_* value of a payload row is type checked and coerced into its wire format:
+    dropdown and multi-select values may be given as option labels or IDs, checkboxes as
+    booleans or "true"/"false", dates as date objects. Rows missing a required field or
+    carrying a custom field that does not apply to the project are rejected. Compile a
+    schema once per project and reuse it for every batch.
+
+    Variables:
+        projectID {int} -- The project the schema was compiled for
+        fields {dict} -- system name -> coercion function
+        required {tuple} -- system names of the required fields
+    """
+
+    def __init__(self, definitions: Iterable[Dict], projectID: int):
+        """
+        Arguments:
+            definitions {list of dict} -- Raw get_result_fields or get_case_fields response
+            projectID {int} -- The project the payloads belong to
+        """
+        log.trace("FieldSchema.__init__ '%s'" % projectID)
+        self.projectID = projectID
+        self.fields = {}
+        required = []
+        for definition in definitions:
+            config = self.__configFor(definition.get("configs") or [], projectID)
+            if config is None:
+                continue
+            options = config.get("options") or {}
+            name = definition["system_name"]
+            self.fields[name] = _compileField(definition, options)
+            if options.get("is_required"):
+                required.append(name)
+        self.required = tuple(required)
+        log.debug("Compiled %d fields, %d required" % (len(self.fields), len(self.required)))
+
+    @staticmethod
+    def __configFor(configs, projectID):
+        for config in configs:
+            context = config.get("context") or {}
+            if context.get("is_global") or projectID in (context.get("project_ids") or ()):
+                return config
+        return None
+
+    def coerce(self, row: Dict) -> Dict:
+        """
+        Validate one payload row and convert its custom fields to wire format
+
+        Arguments:
+            row {dict} -- One result or case payload
+
+        Returns:
+            dict -- A copy of the row with coerced custom field values
+
+        Raises:
+            FieldValidationError -- The row does not match the schema
+        """
+        rslt = dict(row)
+        for name, value in row.items():
+            if not name.startswith("custom_") or value is None:
+                continue
+            coerce = self.fields.get(name)
+            if coerce is None:
+                raise FieldValidationError("%s: not a field of project %s" % (name, self.projectID))
+            rslt[name] = coerce(value)
+        for name in self.required:
+            if rslt.get(name) in (None, "", []):
+                raise FieldValidationError("%s: required field is missing" % name)
+        return rslt
+
+    def partition(self, rows: Iterable[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, str]]]:
+        """
+        Split a batch into coerced rows that can be sent and rows that were rejected
+
+        Arguments:
+            rows {iterable of dict} -- The payload rows
+
+        Returns:
+            tuple -- ([coerced rows], [(rejected row, reason)])
+        """
+        valid, rejected = [], []
+        for row in rows:
+            try:
+                valid.append(self.coerce(row))
+            except FieldValidationError as e:
+                rejected.append((row, str(e)))
+        return valid, rejected
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from .deadline import activate, current
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict
+import threading
+import time
+
+__all__ = ["HedgePolicy"]
+
+
+class HedgePolicy:
+    """
+    Hedged requests for idempotent reads.
+
+    A request that hasn't answered after the given percentile of recent latencies gets a
+    duplicate sent, and whichever answers first is used. Hedges are capped to `maxExtra`
+    times the number of requests so a slow server isn't hit with twice the load. Until
+    `warmup` latencies have been seen the delay is `initialDelay`.
+
+    Latency is measured from when a call starts running, not from when it was submitted.
+    Primaries run on a pool of `workers` threads. Hedges get a pool of their own, so they
+    never queue behind the primaries they are meant to overtake; the hedge budget bounds
+    how many of them there are.
+
+        client = APIClient(url)
+        client.hedge = HedgePolicy(percentile=95, maxExtra=0.05)
+
+    Variables:
+        percentile {float} -- Latency percentile after which a request is hedged
+        maxExtra {float} -- Upper bound of hedges per request
+    """
+
+    def __init__(self, percentile: float = 95, maxExtra: float = 0.05, initialDelay: float = 1.0,
+                 minDelay: float = 0.01, warmup: int = 20, window: int = 500, workers: int = 32):
+        """
+        Keyword Arguments:
+            percentile {float} -- Hedge after this latency percentile (default: {95})
+            maxExtra {float} -- Extra requests allowed, as a share of requests (default: {0.05})
+            initialDelay {float} -- Hedge delay before there are enough samples (default: {1.0})
+            minDelay {float} -- Never hedge sooner than this (default: {0.01})
+            warmup {int} -- Samples needed before the percentile is used (default: {20})
+            window {int} -- Number of recent latencies kept (default: {500})
+            workers {int} -- Threads running primary requests (default: {32})
+        """
+        self.percentile = percentile
+        self.maxExtra = maxExtra
+        self.initialDelay = initialDelay
+        self.minDelay = minDelay
+        self.warmup = warmup
+        self.__latencies = deque(maxlen=window)
+        self.__pool = ThreadPoolExecutor(max_workers=workers)
+        self.__hedges = ThreadPoolExecutor(max_workers=workers)
+        self.__lock = threading.Lock()
+        self.__counts = {"requests": 0, "hedged": 0, "hedgeWins": 0, "cancelled": 0,
+                         "savedSeconds": 0.0}
+
+    def delay(self) -> float:
+        """
+        How long a request may take before it gets hedged
+        """
+        with self.__lock:
+            if len(self.__latencies) < self.warmup:
+                return self.initialDelay
+            ordered = sorted(self.__latencies)
+        n = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))
+        return max(self.minDelay, ordered[n])
+
+    def __call(self, d, fn, args):
+        started = time.monotonic()
+        with activate(d):
+            rslt = fn(*args)
+        return rslt, started, time.monotonic() - started
+
+    def __record(self, future):
+        if not future.cancelled() and future.exception() is None:
+            with self.__lock:
+                self.__latencies.append(future.result()[2])
+
+    def __mayHedge(self) -> bool:
+        with self.__lock:
+            if self.__counts["hedged"] + 1 > self.maxExtra * self.__counts["requests"]:
+                return False
+            self.__counts["hedged"] += 1
+            return True
+
+    def run(self, fn: Callable, *args):
+        """
+        Call fn(*args), hedging it if it is slow
+
+        Returns:
+            The result of whichever call answered first
+
+        Raises:
+            The error of the primary call when no call succeeded
+        """
+        d = current()
+        with self.__lock:
+            self.__counts["requests"] += 1
+        primary = self.__pool.submit(self.__call, d, fn, args)
+        primary.add_done_callback(self.__record)
+        delay = self.delay()
+        if d is not None:
+            delay = max(0, min(delay, d.remaining()))
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.__mayHedge():
+            return primary.result()[0]
+
+        log.debug("Hedging after %.3fs" % delay)
+        hedge = self.__hedges.submit(self.__call, d, fn, args)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((f for f in done if f.exception() is None), None)
+            if winner is None:
+                continue
+            if winner is hedge and primary not in done:
+                with self.__lock:
+                    self.__counts["hedgeWins"] += 1
+                # a primary still queued behind other calls would only run as a duplicate
+                if primary.cancel():
+                    with self.__lock:
+                        self.__counts["cancelled"] += 1
+                else:
+                    _, hedgeStarted, hedgeLatency = hedge.result()
+                    primary.add_done_callback(
+                        lambda f: self.__saved(f, hedgeStarted + hedgeLatency))
+            return winner.result()[0]
+        return primary.result()[0]
+
+    def __saved(self, primary, finished):
+        if primary.exception() is None:
+            _, started, latency = primary.result()
+            with self.__lock:
+                self.__counts["savedSeconds"] += started + latency - finished
+
+    def metrics(self) -> Dict:
+        """
+        Returns:
+            dict -- requests, hedged, hedgeRate, hedgeWins, cancelled (primaries of winning
+                    hedges dropped before they started), savedSeconds (time the winning
+                    hedges saved over their slow primaries) and the current delay
+        """
+        delay = self.delay()
+        with self.__lock:
+            rslt = dict(self.__counts)
+        rslt["hedgeRate"] = float(rslt["hedged"]) / rslt["requests"] if rslt["requests"] else 0.0
+        rslt["delay"] = delay
+        return rslt
+
+    def close(self):
+        """
+        Shut down the thread pools, waiting for the calls in progress
+        """
+        log.trace("HedgePolicy.close")
+        self.__pool.shutdown()
+        self.__hedges.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
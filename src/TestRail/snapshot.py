@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from . import asRecord
+from .api import APIBase
+from typing import Dict, List, NamedTuple
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+__all__ = ["MetadataSnapshot"]
+
+
+MAGIC = b"TRSNAP1"
+
+# snapshot entries that are fetched with a single request each, they make up its version
+VERSIONED = ("projects", "case_types", "priorities", "case_fields", "result_fields")
+
+
+def fingerprint(data: Dict) -> str:
+    """
+    A stable digest of the VERSIONED entries, used as the server side version of a snapshot
+    """
+    content = json.dumps([sorted(data["projects"], key=lambda p: p["id"])] +
+                         [data[k] for k in VERSIONED[1:]], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class MetadataSnapshot(APIBase):
+    """
+    Reference data (projects, suites, case types, priorities, case and result fields) saved
+    to a local file so that short lived processes start without the cold start round trips.
+
+    load() reads the file, which takes milliseconds, and answers from it straight away. A
+    background thread then fetches the projects, case types, priorities and case and
+    result fields, a single request each, and refreshes the file when any of them changed
+    or the snapshot is older than maxAge. Suites take a request per project and are only
+    refreshed along with the rest or by age. A missing, corrupt or foreign snapshot is
+    rebuilt synchronously.
+
+        snapshot = MetadataSnapshot(url, user, key, "/var/cache/testrail.snap").load()
+        projects = TestProjects(url, user, key, projects=snapshot.projects)
+
+    The file is msgpack when msgpack is installed, JSON otherwise, zlib compressed either
+    way.
+
+    Extends:
+        APIBase
+    """
+
+    def __init__(self, baseURI: str, uname: str, apiKey: str, path: str, maxAge: float = 3600,
+                 **options):
+        """
+        Arguments:
+            baseURI {str} -- Base url for the server. https://hostname:port/
+            uname {str} -- The Test Rail username to use
+            apiKey {str} -- The Test Rail API key for the user
+            path {str} -- The snapshot file
+
+        Keyword Arguments:
+            maxAge {float} -- Seconds after which the snapshot is refreshed even if its
+                              fingerprint is unchanged (default: {3600})
+            options -- codec, timeout and hedge, see APIBase
+        """
+        log.trace("MetadataSnapshot.__init__ '%s'" % path)
+        APIBase.__init__(self, baseURI, uname, apiKey, **options)
+        self.baseURI = baseURI
+        self.path = path
+        self.maxAge = maxAge
+        self.data = None
+        self.__refresher = None
+
+    def load(self, validate: bool = True) -> "MetadataSnapshot":
+        """
+        Load the snapshot file, rebuilding it when it is unusable
+
+        Keyword Arguments:
+            validate {bool} -- Check the snapshot against the server in the background
+                               (default: {True})
+
+        Returns:
+            MetadataSnapshot -- self
+        """
+        log.trace("load '%s'" % self.path)
+        data = self.read()
+        if data is None or data.get("url") != self.baseURI:
+            self.refresh()
+            return self
+        self.data = data
+        if validate:
+            self.__refresher = threading.Thread(target=self.__validate, name="snapshot-refresh")
+            self.__refresher.daemon = True
+            self.__refresher.start()
+        return self
+
+    def read(self) -> Dict:
+        """
+        Read and decode the snapshot file
+
+        Returns:
+            dict -- The snapshot content, None if the file is missing or unreadable
+        """
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            if not raw.startswith(MAGIC):
+                raise ValueError("not a snapshot file")
+            kind, payload = raw[len(MAGIC):len(MAGIC) + 1], zlib.decompress(raw[len(MAGIC) + 1:])
+            if kind == b"m":
+                if msgpack is None:
+                    raise ValueError("msgpack snapshot but msgpack isn't installed")
+                data = msgpack.unpackb(payload, raw=False)
+            else:
+                data = self.client.codec.decode(payload)
+            if not isinstance(data, dict):
+                raise ValueError("snapshot holds a %s, not a dict" % type(data).__name__)
+            return data
+        except (IOError, OSError, ValueError, zlib.error) as e:
+            log.info("Snapshot '%s' unusable: %s" % (self.path, e))
+            return None
+
+    def save(self, data: Dict):
+        """
+        Write the snapshot file. The file is replaced atomically so concurrent readers
+        never see a partial snapshot.
+
+        Arguments:
+            data {dict} -- The snapshot content
+        """
+        log.trace("save '%s'" % self.path)
+        if msgpack is not None:
+            raw = MAGIC + b"m" + zlib.compress(msgpack.packb(data, use_bin_type=True))
+        else:
+            raw = MAGIC + b"j" + zlib.compress(self.client.codec.encode(data))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(raw)
+            os.replace(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def fetchVersioned(self) -> Dict:
+        """
+        Fetch the VERSIONED entries, one request each
+
+        Returns:
+            dict -- The entries and their fingerprint
+        """
+        log.trace("fetchVersioned")
+        data = {
+            "projects": list(self.client.send_get_paged("get_projects", "projects")),
+            "case_types": self.client.send_get("get_case_types"),
+            "priorities": self.client.send_get("get_priorities"),
+            "case_fields": self.client.send_get("get_case_fields"),
+            "result_fields": self.client.send_get("get_result_fields"),
+        }
+        data["fingerprint"] = fingerprint(data)
+        return data
+
+    def fetch(self, versioned: Dict = None) -> Dict:
+        """
+        Fetch all the reference data from the server
+
+        Keyword Arguments:
+            versioned {dict} -- fetchVersioned() data already at hand (default: {None})
+
+        Returns:
+            dict -- The snapshot content
+        """
+        log.trace("fetch")
+        data = dict(versioned or self.fetchVersioned())
+        data.update(url=self.baseURI, created=time.time(),
+                    suites={str(p["id"]): self.client.send_get("get_suites/%s" % p["id"])
+                            for p in data["projects"] if not p.get("is_completed")})
+        return data
+
+    def refresh(self, versioned: Dict = None):
+        """
+        Fetch the reference data and save it
+
+        Keyword Arguments:
+            versioned {dict} -- fetchVersioned() data already at hand (default: {None})
+        """
+        log.trace("refresh")
+        data = self.fetch(versioned)
+        self.save(data)
+        self.data = data
+
+    def __validate(self):
+        try:
+            versioned = None
+            stale = time.time() - self.data.get("created", 0) > self.maxAge
+            if not stale:
+                versioned = self.fetchVersioned()
+                stale = versioned["fingerprint"] != self.data.get("fingerprint")
+            if stale:
+                log.info("Snapshot '%s' is stale, refreshing" % self.path)
+                self.refresh(versioned)
+        except Exception as e:
+            log.warning("Snapshot refresh failed: %s" % e)
+
+    def wait(self, timeout: float = None):
+        """
+        Wait for the background validation to finish, e.g. before exiting so a refreshed
+        snapshot gets written
+
+        Keyword Arguments:
+            timeout {float} -- Give up after that many seconds (default: {None})
+        """
+        if self.__refresher is not None:
+            self.__refresher.join(timeout)
+
+    @property
+    def projects(self) -> List[Dict]:
+        return self.data["projects"]
+
+    def projectIDFromName(self, name: str) -> int:
+        """
+        Derive a project ID from a project name
+
+        Raises:
+            KeyError -- No such project
+        """
+        for p in self.data["projects"]:
+            if p["name"] == name:
+                return p["id"]
+        raise KeyError(name)
+
+    def suites(self, projectID: int) -> List[Dict]:
+        """
+        The suites of an active project, like TestSuites.getTestSuites
+        """
+        return self.data["suites"][str(projectID)]
+
+    def caseTypes(self) -> List[NamedTuple]:
+        """
+        Same as TestCases.getTestCaseTypes
+        """
+        return [asRecord(x) for x in self.data["case_types"] if x]
+
+    def priorities(self) -> List[NamedTuple]:
+        """
+        Same as TestCases.getTestCasePriorities
+        """
+        return [asRecord(x) for x in self.data["priorities"] if x]
+
+    def caseFields(self) -> List[Dict]:
+        """
+        The raw get_case_fields response, e.g. for FieldSchema
+        """
+        return self.data["case_fields"]
+
+    def resultFields(self) -> List[Dict]:
+        """
+        The raw get_result_fields response, e.g. for FieldSchema
+        """
+        return self.data["result_fields"]
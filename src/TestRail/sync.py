@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from .api import APIBase, TestCases, TestSuites
+from .concurrency import AdaptiveExecutor, AdaptiveLimiter
+from collections import namedtuple, defaultdict
+from typing import Dict, List, Sequence
+import hashlib
+import json
+
+__all__ = ["DEFAULT_FIELDS", "SyncPlan", "SyncResult", "sectionPath", "caseHash", "SuiteSync"]
+
+
+DEFAULT_FIELDS = ("title", "type_id", "priority_id", "estimate", "milestone_id", "refs",
+                  "custom_preconds", "custom_steps", "custom_expected", "custom_steps_separated")
+
+SyncPlan = namedtuple("SyncPlan", ["sections", "adds", "updates", "moves", "deletes"])
+SyncPlan.__doc__ = """
+The minimal set of writes that brings the remote suite in line with the local definitions
+
+Variables:
+    sections {list of tuple} -- Section paths to create, parents before children
+    adds {list of dict} -- Local definitions with no remote counterpart
+    updates {list of tuple} -- (caseID, {field: value}) for cases whose content changed
+    moves {dict} -- section path -> list of case IDs to move into it
+    deletes {list of int} -- Remote case IDs with no local counterpart
+"""
+
+SyncResult = namedtuple("SyncResult", ["plan", "writes", "errors"])
+
+# fields set by the server, a key among them would never be written to new cases
+READ_ONLY_FIELDS = frozenset(["id", "suite_id", "section_id", "created_by",
+                              "created_on", "updated_by", "updated_on", "display_order",
+                              "is_deleted"])
+
+
+def sectionPath(section) -> tuple:
+    """
+    Normalize a section reference to a path tuple
+
+    Arguments:
+        section {string or sequence} -- "Parent > Child" or ("Parent", "Child")
+
+    Returns:
+        tuple -- ("Parent", "Child")
+    """
+    if isinstance(section, (list, tuple)):
+        return tuple(section)
+    return tuple(p.strip() for p in section.split(">") if p.strip())
+
+
+def normalize(value):
+    """
+    Bring a field value to the form it is compared in. The server pads values it returns:
+    nested objects such as the steps of custom_steps_separated carry extra keys set to
+    null, and text comes back with CRLF line breaks. Null keys are dropped at any depth and
+    line breaks and trailing whitespace of text are made uniform, so a local value and the
+    server's rendering of it compare equal.
+
+    Arguments:
+        value -- A field value, local or remote
+
+    Returns:
+        The normalized value
+    """
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n").rstrip()
+    return value
+
+
+def caseHash(case: Dict, fields: Sequence[str]) -> str:
+    """
+    Hash the normalized content of a case over the chosen fields. Missing fields hash the
+    same as null ones so a local definition may omit fields that are unset remotely.
+
+    Arguments:
+        case {dict} -- Local definition or remote case
+        fields {sequence of str} -- The fields that make up the case content
+
+    Returns:
+        str -- hex digest
+    """
+    content = json.dumps([normalize(case.get(f)) for f in fields], sort_keys=True,
+                         separators=(",", ":"), default=str)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class SuiteSync(APIBase):
+    """
+    Mirror locally defined test cases into a TestRail suite.
+
+    The remote suite is fetched once, each case is hashed over the synchronized fields and
+    compared with the local definitions. Only the differences are written: missing sections
+    are created first (parents before children), then cases are added, updated, moved and
+    deleted concurrently. A sync with no changes issues no writes at all.
+
+    Local definitions are dicts holding a "section" entry ("Parent > Child" or a tuple of
+    names) plus the case fields. Synchronized fields a definition leaves out, or sets to
+    None, are neither compared nor written, so server defaults and values edited in the UI
+    stay as they are. Cases are matched by the key field, title by default, which must be
+    set and unique on both sides.
+
+    Extends:
+        APIBase
+    """
+
+    def __init__(self, baseURI: str, uname: str, apiKey: str, projectID: int, suiteID: int,
+                 fields: Sequence[str] = DEFAULT_FIELDS, key: str = "title",
+                 limiter: AdaptiveLimiter = None, **options):
+        """
+        Arguments:
+            baseURI {str} -- Base url for the server. https://hostname:port/
+            uname {str} -- The Test Rail username to use
+            apiKey {str} -- The Test Rail API key for the user
+            projectID {int} -- The project containing the suite
+            suiteID {int} -- The suite to synchronize
+
+        Keyword Arguments:
+            fields {sequence of str} -- The fields compared and written (default: {DEFAULT_FIELDS})
+            key {str} -- The field matching local definitions to remote cases (default: {"title"})
+            limiter {AdaptiveLimiter} -- Bounds the concurrent writes, a new one by default
+                                         (default: {None})
+            options -- codec, timeout and hedge, see APIBase
+
+        Raises:
+            ValueError -- The key field is set by the server and can't be written
+        """
+        log.trace("SuiteSync.__init__ '%s', '%s'" % (projectID, suiteID))
+        if key in READ_ONLY_FIELDS:
+            raise ValueError("Key field '%s' is read only" % key)
+        APIBase.__init__(self, baseURI, uname, apiKey, **options)
+        self.projectID = projectID
+        self.suiteID = suiteID
+        self.fields = tuple(fields)
+        self.key = key
+        self.limiter = limiter or AdaptiveLimiter()
+        self.__cases = TestCases(baseURI, uname, apiKey, **self.options)
+        self.__suites = TestSuites(baseURI, uname, apiKey, **self.options)
+        self.__sectionIDs = {}
+
+    def fetchRemote(self):
+        """
+        Fetch the sections and cases of the suite, one paginated pass each
+
+        Returns:
+            tuple -- ({section path: section ID}, {key: remote case dict})
+
+        Raises:
+            ValueError -- Remote cases without the key field, or sharing the same key
+        """
+        log.trace("fetchRemote")
+        sections = self.__suites.getSections(self.projectID, self.suiteID)
+        byID = {s["id"]: s for s in sections}
+        paths = {}
+
+        def pathOf(sectionID):
+            if sectionID not in paths:
+                s = byID[sectionID]
+                parent = pathOf(s["parent_id"]) if s.get("parent_id") else ()
+                paths[sectionID] = parent + (s["name"],)
+            return paths[sectionID]
+
+        sectionIDs = {pathOf(i): i for i in byID}
+        path = "get_cases/%s&suite_id=%s" % (self.projectID, self.suiteID)
+        remote = {}
+        duplicates, unkeyed = defaultdict(list), []
+        for case in self.client.send_get_paged(path, "cases"):
+            k = case.get(self.key)
+            if k is None:
+                unkeyed.append(case["id"])
+            elif k in remote:
+                duplicates[k].append(case["id"])
+            else:
+                remote[k] = case
+        if unkeyed:
+            raise ValueError("%d remote cases have no %s: %s" % (
+                len(unkeyed), self.key, ", ".join("C%s" % i for i in unkeyed[:20])))
+        if duplicates:
+            raise ValueError("Duplicate %s in the remote suite: %s" % (self.key, "; ".join(
+                "'%s' (C%s, %s)" % (k, remote[k]["id"], ", ".join("C%s" % i for i in ids))
+                for k, ids in list(duplicates.items())[:20])))
+        log.debug("Fetched %d sections, %d cases" % (len(sectionIDs), len(remote)))
+        return sectionIDs, remote
+
+    def plan(self, local: List[Dict], delete: bool = False) -> SyncPlan:
+        """
+        Work out the writes needed to mirror the local definitions
+
+        Arguments:
+            local {list of dict} -- Local case definitions
+
+        Keyword Arguments:
+            delete {bool} -- Delete remote cases that are not defined locally (default: {False})
+
+        Returns:
+            SyncPlan -- The pending writes
+
+        Raises:
+            ValueError -- Two local or two remote cases share the same key, or a remote
+                          case has none
+        """
+        log.trace("plan %d cases" % len(local))
+        sectionIDs, remote = self.fetchRemote()
+        self.__sectionIDs = sectionIDs
+        return self.diff(local, sectionIDs, remote, delete)
+
+    def diff(self, local: List[Dict], sectionIDs: Dict, remote: Dict, delete: bool = False) -> SyncPlan:
+        """
+        Compare local definitions with an already fetched remote suite
+
+        Arguments:
+            local {list of dict} -- Local case definitions
+            sectionIDs {dict} -- section path -> section ID
+            remote {dict} -- key -> remote case
+
+        Keyword Arguments:
+            delete {bool} -- Delete remote cases that are not defined locally (default: {False})
+
+        Returns:
+            SyncPlan -- The pending writes
+        """
+        seen = set()
+        newSections = set()
+        adds, updates, deletes = [], [], []
+        moves = defaultdict(list)
+        sectionOf = {v: k for k, v in sectionIDs.items()}
+        for definition in local:
+            k = definition.get(self.key)
+            if k in seen:
+                raise ValueError("Duplicate %s in local definitions: '%s'" % (self.key, k))
+            seen.add(k)
+            target = sectionPath(definition["section"])
+            for depth in range(1, len(target) + 1):
+                if target[:depth] not in sectionIDs:
+                    newSections.add(target[:depth])
+            case = remote.get(k)
+            if case is None:
+                adds.append(definition)
+                continue
+            fields = [f for f in self.fields if definition.get(f) is not None]
+            if caseHash(definition, fields) != caseHash(case, fields):
+                changes = {f: definition[f] for f in fields
+                           if normalize(definition[f]) != normalize(case.get(f))}
+                updates.append((case["id"], changes))
+            if sectionOf.get(case["section_id"]) != target:
+                moves[target].append(case["id"])
+        if delete:
+            deletes = [c["id"] for k, c in remote.items() if k not in seen]
+        plan = SyncPlan(sorted(newSections, key=len), adds, updates, dict(moves), deletes)
+        log.debug("Plan: %d sections, %d adds, %d updates, %d moves, %d deletes" % (
+            len(plan.sections), len(adds), len(updates), sum(len(m) for m in moves.values()),
+            len(deletes)))
+        return plan
+
+    def apply(self, plan: SyncPlan) -> SyncResult:
+        """
+        Issue the writes of a plan. Sections are created one depth level at a time so that
+        parents exist before their children, then all case writes run concurrently. When a
+        section can't be created its subsections and the cases that go into any of them are
+        skipped and reported as errors rather than written to the wrong place.
+
+        Arguments:
+            plan {SyncPlan} -- As returned by plan()
+
+        Returns:
+            SyncResult -- The plan, the number of writes issued and any (operation, error) pairs
+        """
+        log.trace("apply")
+        errors = []
+        writes = 0
+        failed = set()
+
+        def missing(path):
+            # the section, or one of its parents, failed to be created
+            return any(path[:depth] in failed for depth in range(1, len(path) + 1))
+
+        with AdaptiveExecutor(self.limiter) as pool:
+            levels = defaultdict(list)
+            for path in plan.sections:
+                levels[len(path)].append(path)
+            for depth in sorted(levels):
+                futures = {}
+                for path in levels[depth]:
+                    if missing(path[:-1]):
+                        failed.add(path)
+                        errors.append((("add_section", path), ValueError(
+                            "Parent section '%s' was not created" % " > ".join(path[:-1]))))
+                        continue
+                    futures[pool.submit(self.__suites.addSection, self.projectID, self.suiteID,
+                                        path[-1], self.__sectionIDs.get(path[:-1]))] = path
+                for f, path in futures.items():
+                    writes += 1
+                    try:
+                        self.__sectionIDs[path] = f.result()["id"]
+                    except Exception as e:
+                        log.error("add_section %s failed: %s" % (" > ".join(path), e))
+                        failed.add(path)
+                        errors.append((("add_section", path), e))
+
+            futures = {}
+            for definition in plan.adds:
+                path = sectionPath(definition["section"])
+                if missing(path):
+                    errors.append((("add_case", definition.get(self.key)), ValueError(
+                        "Section '%s' was not created" % " > ".join(path))))
+                    continue
+                details = {f: definition[f] for f in self.fields if definition.get(f) is not None}
+                details[self.key] = definition.get(self.key)
+                futures[pool.submit(self.__cases.addTestCase, self.__sectionIDs.get(path),
+                                    **details)] = ("add_case", definition.get(self.key))
+            for caseID, changes in plan.updates:
+                futures[pool.submit(self.__cases.updateTestCase, caseID, **changes)] = \
+                    ("update_case", caseID)
+            for path, caseIDs in plan.moves.items():
+                if missing(path):
+                    errors.append((("move_cases", path), ValueError(
+                        "Section '%s' was not created" % " > ".join(path))))
+                    continue
+                futures[pool.submit(self.__cases.moveTestCases, self.suiteID,
+                                    self.__sectionIDs.get(path), caseIDs)] = ("move_cases", path)
+            for caseID in plan.deletes:
+                futures[pool.submit(self.__cases.deleteTestCase, caseID)] = ("delete_case", caseID)
+            for f, op in futures.items():
+                writes += 1
+                try:
+                    f.result()
+                except Exception as e:
+                    log.error("%s %s failed: %s" % (op[0], op[1], e))
+                    errors.append((op, e))
+        log.debug("Issued %d writes, %d failed" % (writes, len(errors)))
+        return SyncResult(plan, writes, errors)
+
+    def sync(self, local: List[Dict], delete: bool = False) -> SyncResult:
+        """
+        Fetch, diff and apply in one go
+
+        Arguments:
+            local {list of dict} -- Local case definitions
+
+        Keyword Arguments:
+            delete {bool} -- Delete remote cases that are not defined locally (default: {False})
+
+        Returns:
+            SyncResult -- The plan, the number of writes issued and any errors
+        """
+        log.trace("sync %d cases" % len(local))
+        sectionIDs, remote = self.fetchRemote()
+        self.__sectionIDs = sectionIDs
+        return self.apply(self.diff(local, sectionIDs, remote, delete))
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from . import log
+from .api import TestResults
+from .concurrency import AdaptiveExecutor, AdaptiveLimiter
+from typing import Callable, Dict, Iterator, List, Tuple
+import queue
+import threading
+
+__all__ = ["RunWatcher"]
+
+
+class _RunState:
+    """
+    High-water mark of one watched run: the newest created_on delivered and the IDs of
+    the results created in that same second, which the next poll will see again
+    """
+    __slots__ = ("after", "seen", "callback")
+
+    def __init__(self, since, callback):
+        self.after = since
+        self.seen = set()
+        self.callback = callback
+
+
+class RunWatcher:
+    """
+    Follow active test runs and deliver only the results that are new since the last poll.
+
+    Each watched run keeps a high-water mark, and every poll asks get_results_for_run for
+    the results created after it, so the cost of a poll depends on the new activity rather
+    than on the size of the run. One scheduler thread polls all the runs every `interval`
+    seconds, fanning out over an adaptive pool. New results go to the run's callback if it
+    has one, otherwise they are queued for results().
+
+        with RunWatcher(url, user, key, interval=5) as watcher:
+            watcher.watch(101)
+            watcher.watch(102, callback=lambda runID, result: print(runID, result["id"]))
+            for runID, result in watcher.results():
+                ..
+    """
+
+    def __init__(self, baseURI: str, uname: str, apiKey: str, interval: float = 5.0,
+                 limiter: AdaptiveLimiter = None, **options):
+        """
+        Arguments:
+            baseURI {str} -- Base url for the server. https://hostname:port/
+            uname {str} -- The Test Rail username to use
+            apiKey {str} -- The Test Rail API key for the user
+
+        Keyword Arguments:
+            interval {float} -- Seconds between polls (default: {5.0})
+            limiter {AdaptiveLimiter} -- Bounds the concurrent polls (default: {None})
+            options -- codec, timeout and hedge, see APIBase
+        """
+        log.trace("RunWatcher.__init__ %s" % interval)
+        self.interval = interval
+        self.__results = TestResults(baseURI, uname, apiKey, **options)
+        self.__pool = AdaptiveExecutor(limiter or AdaptiveLimiter(maxLimit=16))
+        self.__runs = {}
+        self.__lock = threading.Lock()
+        self.__queue = queue.Queue()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def watch(self, runID: int, callback: Callable = None, since: int = 0):
+        """
+        Start following a run
+
+        Arguments:
+            runID {int} -- The test run
+
+        Keyword Arguments:
+            callback {callable} -- Called as callback(runID, result) for each new result,
+                                   instead of queueing it for results() (default: {None})
+            since {int} -- Only deliver results created after this UNIX timestamp, 0 for
+                           the whole run on the first poll (default: {0})
+        """
+        log.trace("watch '%s', %s" % (runID, since))
+        with self.__lock:
+            self.__runs[runID] = _RunState(since, callback)
+
+    def unwatch(self, runID: int):
+        """
+        Stop following a run
+        """
+        log.trace("unwatch '%s'" % runID)
+        with self.__lock:
+            self.__runs.pop(runID, None)
+
+    def __pollRun(self, runID: int, state: _RunState) -> List[Dict]:
+        # created_after is asked one second early so results that land in the same second
+        # as the last poll aren't missed, the ones already delivered are skipped by ID
+        results = self.__results.getResultsForTestRun(runID, state.after - 1 if state.after else None)
+        new = [r for r in results if r["id"] not in state.seen]
+        if new:
+            newest = max(r["created_on"] for r in new)
+            if newest > state.after:
+                state.after, state.seen = newest, set()
+            state.seen.update(r["id"] for r in new if r["created_on"] == state.after)
+        return sorted(new, key=lambda r: (r["created_on"], r["id"]))
+
+    def poll(self) -> int:
+        """
+        Poll every watched run once and deliver the new results. An error raised by a
+        callback is logged and delivery carries on with the next result.
+
+        Returns:
+            int -- The number of new results
+        """
+        with self.__lock:
+            runs = list(self.__runs.items())
+        futures = [(runID, state, self.__pool.submit(self.__pollRun, runID, state))
+                   for runID, state in runs]
+        count = 0
+        for runID, state, future in futures:
+            try:
+                new = future.result()
+            except Exception as e:
+                log.warning("Polling run %s failed: %s" % (runID, e))
+                continue
+            count += len(new)
+            for result in new:
+                if state.callback is None:
+                    self.__queue.put((runID, result))
+                    continue
+                # the mark has already moved past the result, a failing callback must not
+                # cost the results after it
+                try:
+                    state.callback(runID, result)
+                except Exception as e:
+                    log.error("Callback for result %s of run %s failed: %s" % (
+                        result.get("id"), runID, e))
+        log.debug("Polled %d runs, %d new results" % (len(runs), count))
+        return count
+
+    def __schedule(self):
+        while not self.__stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                log.error("Run watcher poll failed: %s" % e)
+            self.__stop.wait(self.interval)
+
+    def start(self):
+        """
+        Start the scheduler thread
+        """
+        log.trace("start")
+        if self.__thread is None:
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__schedule, name="run-watcher")
+            self.__thread.daemon = True
+            self.__thread.start()
+
+    def stop(self):
+        """
+        Stop the scheduler thread after the poll in progress
+        """
+        log.trace("stop")
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        self.__queue.put(None)
+
+    def results(self, timeout: float = None) -> Iterator[Tuple[int, Dict]]:
+        """
+        Iterate over new results of the runs that have no callback, as (runID, result),
+        until the watcher is stopped
+
+        Keyword Arguments:
+            timeout {float} -- Stop iterating after that many seconds without a new result
+                               (default: {None})
+        """
+        while True:
+            try:
+                item = self.__queue.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if item is None:
+                return
+            yield item
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        self.__pool.shutdown()